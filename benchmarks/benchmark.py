@@ -0,0 +1,242 @@
+import argparse
+import glob
+import gzip
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import textwrap
+import time
+import tracemalloc
+from typing import Callable, Iterable
+from xml.etree import ElementTree
+
+# run from the repository root as `python -m benchmarks.benchmark`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.rss_feed import iter_items
+
+
+def load_archive(directory: str, scale: int = 1) -> list[dict]:
+    # archived documents from every organization, repeated scale times for a synthetic larger corpus
+    documents = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.jsonl.gz'))):
+        organization = os.path.basename(path).split('.')[0]
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                document = json.loads(line)
+                documents.append({'organization': organization, 'text': document.get('text') or ''})
+    return [{**document, 'doc_id': index} for index, document in enumerate(documents * scale)]
+
+
+def load_feed(xml_file: str, scale: int = 1) -> bytes:
+    # the archived feed with its items repeated scale times
+    tree = ElementTree.parse(xml_file)
+    channel = tree.getroot().find('channel')
+    items = channel.findall('item')
+    for _ in range(scale - 1):
+        channel.extend(items)
+    return ElementTree.tostring(tree.getroot(), encoding='utf-8')
+
+
+def raw_descriptions(feed: bytes) -> list[str]:
+    return [item.findtext('description') or '' for item in iter_items(io.BytesIO(feed))]
+
+
+def raw_reuters_bodies(corpus: list[dict]) -> list[str]:
+    # the archive holds cleaned texts, so the dateline that clean_text strips from reuters articles is put back
+    return [f"WASHINGTON, April 16 (Reuters) - {document['text']}" for document in corpus
+            if document['organization'] == 'reuters']
+
+
+def raw_committee_pages(corpus: list[dict]) -> list[str]:
+    # the archive holds cleaned texts, so committee testimony is laid out again as pdf text: short lines and pages
+    pages = []
+    for document in corpus:
+        if document['organization'] == 'committee':
+            lines = textwrap.wrap(document['text'], 80)
+            pages.append('\n\n'.join('\n'.join(lines[start:start + 50]) for start in range(0, len(lines), 50)))
+    return pages
+
+
+def timed_pass(items: Iterable, function: Callable) -> tuple[list[float], float]:
+    # time producing each item plus applying function to it, so lazy stages are measured too
+    latencies = []
+    iterator = iter(items)
+    started = time.perf_counter()
+    while True:
+        item_started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            break
+        function(item)
+        latencies.append(time.perf_counter() - item_started)
+    return latencies, time.perf_counter() - started
+
+
+def measure(items: Callable[[], Iterable], function: Callable, memory: bool = True) -> dict:
+    # tracemalloc slows allocation heavy code several times over, so the timings come from an untraced pass and peak
+    # memory from a second, traced one; items makes a fresh iterable for each pass
+    latencies, elapsed = timed_pass(items(), function)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        timed_pass(items(), function)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return summarize(latencies, elapsed, peak)
+
+
+def summarize(latencies: list[float], elapsed: float, peak_memory: int | None) -> dict:
+    quantiles = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        'items': len(latencies),
+        'seconds': elapsed,
+        'items_per_second': len(latencies) / elapsed if elapsed else 0.0,
+        'latency_p50': quantiles[49],
+        'latency_p90': quantiles[89],
+        'latency_p99': quantiles[98],
+        'peak_python_memory': peak_memory
+    }
+
+
+def bench_clean_text(corpus: list[dict], feed: bytes, arguments) -> dict:
+    from src import ap_news_data, committee_data, reuters_news_data
+    descriptions = raw_descriptions(feed)
+    pages = raw_committee_pages(corpus)
+    bodies = raw_reuters_bodies(corpus)
+    return {
+        'clean_text.ap_news': measure(lambda: descriptions, ap_news_data.clean_text, arguments.memory),
+        'clean_text.committee': measure(lambda: pages, committee_data.clean_text, arguments.memory),
+        'clean_text.reuters': measure(lambda: bodies, reuters_news_data.clean_text, arguments.memory)
+    }
+
+
+def bench_import_feed(corpus: list[dict], feed: bytes, arguments) -> dict:
+    from src.ap_news_data import import_data_from_file
+    return {'import_data_from_file': measure(lambda: import_data_from_file(io.BytesIO(feed)), lambda item: None,
+                                             arguments.memory)}
+
+
+def bench_ner(corpus: list[dict], feed: bytes, arguments) -> dict:
+    import spacy
+    from main import extract_entities, unused_components
+    nlp = spacy.load(arguments.model, disable=unused_components)
+    entities = lambda: extract_entities(nlp, (document['text'] for document in corpus),
+                                        batch_size=arguments.batch_size, n_process=arguments.n_process)
+    return {f'ner.{arguments.model}': measure(entities, lambda item: None, arguments.memory)}
+
+
+def bench_match(corpus: list[dict], feed: bytes, arguments) -> dict:
+    from main import classes
+    from src.entity_matcher import AliasAutomaton, compile_index
+    automaton = AliasAutomaton(compile_index(classes))
+    return {'alias_matching': measure(lambda: (document['text'] for document in corpus), automaton.count,
+                                      arguments.memory)}
+
+
+def corpus_mentions(corpus: list[dict]) -> list[tuple[str, int, str, int]]:
+    # alias matches stand in for NER output so aggregation can be measured on its own
+    from main import classes
+    from src.entity_matcher import AliasAutomaton, compile_index
+    automaton = AliasAutomaton(compile_index(classes))
+    return [(document['organization'], document['doc_id'], entity, count)
+            for document in corpus for entity, count in automaton.count(document['text']).items()]
+
+
+def organization_counts(corpus: list[dict]) -> dict[str, int]:
+    documents_count = {}
+    for document in corpus:
+        documents_count[document['organization']] = documents_count.get(document['organization'], 0) + 1
+    return documents_count
+
+
+def bench_aggregation(corpus: list[dict], feed: bytes, arguments) -> dict:
+    from main import classes
+    from src.aggregation import figure_data, mentions_frame
+    mentions = corpus_mentions(corpus)
+    documents_count = organization_counts(corpus)
+    return {'aggregation': measure(lambda: [mentions], lambda rows: figure_data(mentions_frame(rows), documents_count,
+                                                                                classes), arguments.memory)}
+
+
+def bench_figure_data(corpus: list[dict], feed: bytes, arguments) -> dict:
+    from main import classes
+    from src.aggregation import (class_proportion_table, entity_proportion_table, figure_data, mentions_frame,
+                                 mentions_per_document_table, raw_count_table)
+    documents_count = organization_counts(corpus)
+    data = figure_data(mentions_frame(corpus_mentions(corpus)), documents_count, classes)
+    tables = [raw_count_table, mentions_per_document_table, entity_proportion_table,
+              lambda data: class_proportion_table(data, classes)]
+    return {'figure_data': measure(lambda: tables, lambda table: table(data), arguments.memory)}
+
+
+stages = {
+    'clean': bench_clean_text,
+    'import': bench_import_feed,
+    'ner': bench_ner,
+    'match': bench_match,
+    'aggregate': bench_aggregation,
+    'figures': bench_figure_data
+}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    # stages whose throughput fell more than tolerance below the baseline
+    regressions = []
+    for name, result in results['stages'].items():
+        if name not in baseline['stages'] or not baseline['stages'][name]['items_per_second']:
+            continue
+        change = result['items_per_second'] / baseline['stages'][name]['items_per_second'] - 1
+        if change < -tolerance:
+            regressions.append(f"{name}: {change:+.1%} items/sec "
+                               f"(p50 {baseline['stages'][name]['latency_p50']:.6f}s -> {result['latency_p50']:.6f}s)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the throughput of each stage on the archived corpus.")
+    parser.add_argument('--stages', nargs='+', choices=list(stages), default=['clean', 'import', 'match', 'aggregate',
+                                                                              'figures'])
+    parser.add_argument('--scale', type=int, default=1, help="repeat the archived corpus this many times")
+    parser.add_argument('--archive', default='organization-data', help="directory with the archived corpus")
+    parser.add_argument('--model', default='en_core_web_sm', help="spaCy model for the ner stage")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--n-process', type=int, default=1)
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help="skip the traced pass that measures peak python memory, e.g. for slow ner runs")
+    parser.add_argument('--output', default='bench_results.json', help="where to write the results")
+    parser.add_argument('--compare', help="earlier results file to check for regressions against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed throughput drop before failing")
+    arguments = parser.parse_args()
+
+    corpus = load_archive(arguments.archive, arguments.scale)
+    feed = load_feed(os.path.join(arguments.archive, 'apnews.xml'), arguments.scale)
+    results = {'scale': arguments.scale, 'documents': len(corpus), 'python': platform.python_version(),
+               'started': time.strftime('%Y-%m-%dT%H:%M:%S'), 'stages': {}}
+    for name in arguments.stages:
+        for stage, result in stages[name](corpus, feed, arguments).items():
+            results['stages'][stage] = result
+            print(f"{stage:<32} {result['items_per_second']:>12.1f} items/s  p50 {result['latency_p50'] * 1000:.3f}ms  "
+                  f"p99 {result['latency_p99'] * 1000:.3f}ms")
+    # ru_maxrss is in kilobytes on linux and bytes on macos
+    results['peak_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+    with open(arguments.output, 'w') as file:
+        json.dump(results, file, indent=2)
+
+    if arguments.compare:
+        with open(arguments.compare) as file:
+            regressions = compare(results, json.load(file), arguments.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,22 @@
-from collections import Counter, ChainMap
+import argparse
+import functools
+import sys
+from collections import Counter, deque
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator
 
-import pandas
-import seaborn
-import spacy
-from matplotlib import pyplot
-from tqdm import tqdm
+from src.chunking import chunk_spans, merge_spans
+from src.entity_cache import EntityCache, document_key, model_version
+from src.entity_matcher import AliasAutomaton, compile_index, normalize
+from src.instrumentation import metrics, profile_stage, serve_prometheus, write_summary
+from src.ner_service import NERClient
+from src.pipeline import run as run_pipeline
+from src.relevance import RelevanceGate, span_recall
 
-from src.ap_news_data import import_data_from_file as import_ap_news_data
-from src.cnn_news_data import manual_import as import_cnn_news_data
-from src.committee_data import import_data as import_committee_data
-from src.fox_news_data import manual_import as import_fox_news_data
-from src.reuters_news_data import manual_import as import_reuters_news_data
+if TYPE_CHECKING:
+    from src.count_index import CountIndex
+
+# heavy dependencies (spaCy, pandas, matplotlib, pyarrow, the loaders) are imported inside the commands that use them,
+# so e.g. `python main.py plot` never loads a model or the fetching stack
 
 # entities and what entity class they belong to
 classes = {
@@ -37,9 +43,160 @@ classes = {
 }
 
 
-def main():
-    # maps for each source to load their documents
-    source_data = [
+# pipeline components that entity extraction never uses
+unused_components = ['tagger', 'parser', 'attribute_ruler', 'lemmatizer']
+
+# entity labels that are counted
+entity_labels = ['PERSON', 'GPE', 'ORG']
+
+
+def extract_spans(nlp, texts: Iterable[str], batch_size: int = 32, n_process: int = 1,
+                  cache: EntityCache | None = None) -> Iterator[list[tuple[str, str, int, int]]]:
+    # look up already-processed documents and only run spaCy over the ones the cache has not seen
+    version = model_version(nlp) if cache is not None else None
+    pending = deque()
+    parsed = 0
+
+    def missing_texts():
+        for text in texts:
+            key = document_key(text, version, entity_labels) if cache is not None else None
+            spans = cache.get(key) if cache is not None else None
+            pending.append((key, spans))
+            if spans is None:
+                yield text
+
+    # nlp.pipe keeps its input order, so each parsed document belongs to the oldest pending miss
+    parsed_documents = iter(nlp.pipe(missing_texts(), batch_size=batch_size, n_process=n_process))
+    while True:
+        # documents are parsed in batches, so this is each document's share of its batch's latency
+        # (plus any wait on the stage feeding it)
+        with metrics.timer('ner.document'):
+            parsed_document = next(parsed_documents, None)
+        if parsed_document is None:
+            break
+        while pending[0][1] is not None:
+            yield pending.popleft()[1]
+        key, _ = pending.popleft()
+        spans = [(entity.text, entity.label_, entity.start_char, entity.end_char)
+                 for entity in parsed_document.ents if entity.label_ in entity_labels]
+        if cache is not None:
+            cache.put(key, spans)
+            # commit once per parsed batch, so the write lock is not held while the next batch is parsed
+            parsed += 1
+            if parsed % batch_size == 0:
+                cache.commit()
+        metrics.increment('ner.documents')
+        yield spans
+    if cache is not None:
+        cache.commit()
+    while pending:
+        yield pending.popleft()[1]
+
+
+def extract_entities(nlp, texts: Iterable[str], batch_size: int = 32, n_process: int = 1,
+                     cache: EntityCache | None = None) -> Iterator[list[str]]:
+    # run the documents through spaCy in batches and keep only the entity labels we count
+    for spans in extract_spans(nlp, texts, batch_size=batch_size, n_process=n_process, cache=cache):
+        yield entity_strings(spans)
+
+
+def entity_strings(spans: list[tuple[str, str, int, int]]) -> list[str]:
+    return [text.strip().replace('\n', '') for text, _, _, _ in spans]
+
+
+def load_documents(source: dict) -> Iterator[dict[str, str | None]]:
+    for doc_id, document in enumerate(source['Loader'](source['Link'] if 'Link' in source else None)):
+        yield {'doc_id': doc_id,
+               'url': document[source['UrlLabel']],
+               'date': document[source['PublishedLabel']] if 'PublishedLabel' in source else None,
+               'text': document[source['TextLabel']]}
+
+
+def annotate_documents(nlp, documents: Iterable[dict], batch_size: int = 32, n_process: int = 1,
+                       cache: EntityCache | None = None, relevance: RelevanceGate | None = None,
+                       client: NERClient | None = None, chunk_tokens: int | None = 1000,
+                       chunk_overlap: int = 50) -> Iterator[dict]:
+    # with a relevance gate only the sentences around alias hits are parsed, and spans are mapped back to the document
+    # with a client the spans come from a running NER service instead of nlp
+    # texts longer than chunk_tokens are parsed as overlapping windows, so memory does not grow with document length
+    pending = deque()
+
+    def texts():
+        for document in documents:
+            offsets = None
+            text = document['text']
+            if relevance is not None:
+                text, offsets = relevance.select(text)
+            windows = chunk_spans(text, chunk_tokens, chunk_overlap) if chunk_tokens else [(0, len(text))]
+            pending.append((document, offsets, windows))
+            for start, end in windows:
+                yield text[start:end]
+
+    spans_iterator = client.annotate(texts()) if client is not None else \
+        extract_spans(nlp, texts(), batch_size=batch_size, n_process=n_process, cache=cache)
+    window_spans = []
+    for spans in spans_iterator:
+        document, offsets, windows = pending[0]
+        window_spans.append((windows[len(window_spans)][0], spans))
+        if len(window_spans) < len(windows):
+            continue
+        pending.popleft()
+        if len(windows) > 1:
+            spans = merge_spans(window_spans)
+            metrics.increment('ner.chunked_documents')
+        window_spans = []
+        if offsets is not None:
+            spans = relevance.restore(spans, offsets)
+        yield {**document, 'spans': spans, 'entities': entity_strings(spans)}
+
+
+def measure_recall(nlp, documents: Iterable[dict], aliases: set[str], batch_size: int = 32, n_process: int = 1,
+                   cache: EntityCache | None = None, client: NERClient | None = None, chunk_tokens: int | None = 1000,
+                   chunk_overlap: int = 50) -> Iterator[dict]:
+    # also run full NER over gated documents and count how many of its spans the gated run recovered
+    pending = deque()
+
+    def originals():
+        for document in documents:
+            pending.append(document)
+            yield {'text': document['text']}
+
+    for full in annotate_documents(nlp, originals(), batch_size=batch_size, n_process=n_process, cache=cache,
+                                   client=client, chunk_tokens=chunk_tokens, chunk_overlap=chunk_overlap):
+        document = pending.popleft()
+        for name, value in span_recall(full['spans'], document['spans'], aliases).items():
+            metrics.increment(f'relevance.{name}', value)
+        yield document
+
+
+def recall_report() -> str:
+    counters = metrics.snapshot()['counters']
+
+    def ratio(numerator: str, denominator: str) -> float:
+        return counters.get(numerator, 0) / counters[denominator] if counters.get(denominator) else 1.0
+
+    return (f"Relevance gate: kept {ratio('relevance.kept_characters', 'relevance.characters'):.1%} of the text, "
+            f"recalled {ratio('relevance.recalled_spans', 'relevance.spans'):.1%} of all entities and "
+            f"{ratio('relevance.recalled_alias_spans', 'relevance.alias_spans'):.1%} of class entities")
+
+
+def match_documents(automaton: AliasAutomaton, documents: Iterable[dict]) -> Iterator[dict]:
+    # fast non-NER mode that counts class aliases directly in the raw text
+    for document in documents:
+        spans = [(document['text'][start:end], 'ALIAS', start, end) for start, end in automaton.find(document['text'])]
+        yield {**document, 'spans': spans, 'entities': [normalize(text) for text, _, _, _ in spans]}
+
+
+def source_data(watermark_path: str | None = None, commits: list[Callable[[], None]] | None = None) -> list[dict]:
+    # maps for each source to load their documents. with a watermark file the rss feed only gives items that are new
+    # since the last successful run, and its new watermark is saved by the callbacks the loader adds to commits
+    from src.ap_news_data import import_data_from_file as import_ap_news_data
+    from src.cnn_news_data import manual_import as import_cnn_news_data
+    from src.committee_data import import_data as import_committee_data
+    from src.fox_news_data import manual_import as import_fox_news_data
+    from src.reuters_news_data import manual_import as import_reuters_news_data
+
+    return [
         {
             "Organization": "Committee",
             "Loader": import_committee_data,
@@ -49,7 +206,7 @@ def main():
         },
         {
             "Organization": "AP News",
-            "Loader": import_ap_news_data,
+            "Loader": functools.partial(import_ap_news_data, watermark_path=watermark_path, commits=commits),
             "Link": "data/apnews.xml",
             "UrlLabel": "link",
             "PublishedLabel": "pubDate",
@@ -76,55 +233,281 @@ def main():
         }
     ]
 
+
+@functools.cache
+def load_model(model: str):
+    # loaded the first time a document needs NER, and only once per process
+    import spacy
+    return spacy.load(model, disable=unused_components)
+
+
+def annotator(model: str = "en_core_web_trf", batch_size: int = 32, n_process: int = 1,
+              cache: EntityCache | None = None, match_mode: str = 'ner', relevance_gate: bool = False,
+              relevance_context: int = 1, relevance_recall: bool = False,
+              ner_service: str | None = None, chunk_tokens: int | None = 1000,
+              chunk_overlap: int = 50) -> Callable[[Iterable[dict]], Iterator[dict]]:
+    # the stage that adds spans and entities to each document, shared by extract and the sharded workers
+    if match_mode != 'ner':
+        automaton = AliasAutomaton(compile_index(classes))
+        return lambda documents: match_documents(automaton, documents)
+
+    aliases = set(compile_index(classes))
+    relevance = RelevanceGate(aliases, context=relevance_context) if relevance_gate else None
+
+    def annotate(documents):
+        if ner_service:
+            return annotate_remotely(documents)
+        nlp = load_model(model)
+        documents = annotate_documents(nlp, documents, batch_size=batch_size, n_process=n_process, cache=cache,
+                                       relevance=relevance, chunk_tokens=chunk_tokens, chunk_overlap=chunk_overlap)
+        if relevance is not None and relevance_recall:
+            documents = measure_recall(nlp, documents, aliases, batch_size=batch_size, n_process=n_process,
+                                       cache=cache, chunk_tokens=chunk_tokens, chunk_overlap=chunk_overlap)
+        return documents
+
+    def annotate_remotely(documents):
+        # the service owns the model and its cache, so this process never loads spaCy. a client answers one stream
+        # of texts at a time, so the recall pass gets its own connection; both are closed once the documents are
+        # done or abandoned
+        clients = [NERClient(ner_service)]
+        try:
+            documents = annotate_documents(None, documents, relevance=relevance, client=clients[0],
+                                           chunk_tokens=chunk_tokens, chunk_overlap=chunk_overlap)
+            if relevance is not None and relevance_recall:
+                clients.append(NERClient(ner_service))
+                documents = measure_recall(None, documents, aliases, client=clients[1], chunk_tokens=chunk_tokens,
+                                           chunk_overlap=chunk_overlap)
+            yield from documents
+        finally:
+            for client in clients:
+                client.close()
+    return annotate
+
+
+def serve(model: str = "en_core_web_trf", socket_path: str = 'data/ner.sock', batch_size: int = 32,
+          max_latency: float = 0.05, max_queue: int = 256, cache_path: str | None = 'data/entity_cache.sqlite') -> None:
+    from src.ner_service import serve as serve_ner
+
+    # load the model once and answer NER requests from any number of runs or notebooks until interrupted.
+    # extract_spans commits the cache after every batch, so a killed service keeps what it has parsed
+    nlp = load_model(model)
+    cache = EntityCache(cache_path) if cache_path else None
+    print(f"Serving {model} on {socket_path}")
+    try:
+        serve_ner(lambda texts: list(extract_spans(nlp, texts, batch_size=len(texts), cache=cache)), socket_path,
+                  batch_size=batch_size, max_latency=max_latency, max_queue=max_queue)
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def fetch() -> None:
+    # run every loader once so its pages and pdfs land in the response archive, without any NER
+    for source in source_data():
+        count = sum(1 for _ in load_documents(source))
+        print(f"{source['Organization']}: {count} documents")
+
+
+def extract(model: str = "en_core_web_trf", batch_size: int = 32, n_process: int = 1,
+            cache_path: str | None = 'data/entity_cache.sqlite', rebuild_cache: bool = False, queue_size: int = 64,
+            match_mode: str = 'ner', corpus_path: str = 'data/corpus', profile_path: str | None = None,
+            dedup_scope: str = 'organization', dedup_threshold: float = 0.9, duplicates_path: str | None = None,
+            index_path: str | None = 'data/count_index', rollups_path: str | None = 'data/rollups.sqlite',
+            rebuild_rollups: bool = False, relevance_gate: bool = False, relevance_context: int = 1,
+            relevance_recall: bool = False, max_entities: int | None = None,
+            ner_service: str | None = None, chunk_tokens: int | None = 1000, chunk_overlap: int = 50,
+            watermark_path: str | None = None) -> 'CountIndex':
+    from tqdm import tqdm
+
+    from src.corpus_store import write_corpus
+    from src.count_index import CountIndex
+    from src.deduplication import Deduplicator, drop_duplicates
+    from src.entity_counts import EntityCounter
+    from src.rollups import MentionRollups
+
     # find distribution of entities for each source
-    nlp = spacy.load("en_core_web_trf")
-    source_entities = []
-    for source in source_data:
-        entities = []
-        documents = []
-        for d, document in enumerate(tqdm(source['Loader'](source['Link'] if 'Link' in source else None),
-                                          desc=f'Processing {source["Organization"]}')):
-            documents.append({'url': document[source['UrlLabel']],
-                              'date': document[source['PublishedLabel']] if 'PublishedLabel' in source else None,
-                              'text': document[source['TextLabel']]})
-            parsed_document = nlp(document[source['TextLabel']])
-            entities += [str(entity).strip().replace('\n', '') for entity in parsed_document.ents if
-                         entity.label_ in ['PERSON', 'GPE', 'ORG']]
-        source_entities.append(
-            {"Organization": source["Organization"], "Counts": Counter(entities.copy()), "Documents Count": d})
-        pandas.DataFrame(documents).to_json(f"data/{source['Organization'].lower().replace(' ', '_')}.jsonl.gz",
-                                            orient='records', lines=True)
+    cache = EntityCache(cache_path, rebuild=rebuild_cache) \
+        if cache_path and match_mode == 'ner' and not ner_service else None
+    annotate = annotator(model, batch_size=batch_size, n_process=n_process, cache=cache, match_mode=match_mode,
+                         relevance_gate=relevance_gate, relevance_context=relevance_context,
+                         relevance_recall=relevance_recall, ner_service=ner_service, chunk_tokens=chunk_tokens,
+                         chunk_overlap=chunk_overlap)
+    # dated documents are also folded into daily and weekly rollups, which persist and grow across runs
+    rollups = MentionRollups(rollups_path, classes, rebuild=rebuild_rollups) if rollups_path else None
+    # class aliases are always counted exactly, however many other entities turn up
+    counter = EntityCounter(max_entities=max_entities, reserved=compile_index(classes))
+    deduplicators = []
+    # feed watermarks are only saved once the run has succeeded, so items are not marked as seen before they are stored
+    watermark_commits = []
+    for source in source_data(watermark_path, watermark_commits):
+        # near-duplicate articles are dropped before they reach NER, either within each organization or across all
+        if dedup_scope == 'organization' or (dedup_scope == 'all' and not deduplicators):
+            deduplicators.append(Deduplicator(threshold=dedup_threshold))
+        # stream documents through fetch and clean -> NER -> sink -> count, with bounded queues between stages
+        stages = {
+            'load': load_documents,
+            'dedup': lambda documents: drop_duplicates(documents, deduplicators[-1], source['Organization']),
+            'annotate': annotate,
+            'store': lambda documents: write_corpus(documents, corpus_path, source['Organization'])
+        }
+        if not deduplicators:
+            del stages['dedup']
+        if profile_path:
+            # dump a cProfile of each stage per organization, e.g. profiles/cnn.annotate.prof
+            stages = {name: lambda items, name=name, function=function: profile_stage(
+                f"{source['Organization'].lower().replace(' ', '_')}.{name}", function(items), profile_path)
+                for name, function in stages.items()}
+        for document in tqdm(run_pipeline(source, list(stages.values()), maxsize=queue_size),
+                             desc=f'Processing {source["Organization"]}'):
+            counter.add_document(source["Organization"], document['doc_id'], document['date'], document['entities'])
+            if rollups is not None:
+                rollups.add(source["Organization"], document['url'], document['date'], document['entities'])
+    if duplicates_path:
+        with open(duplicates_path, 'w') as file:
+            for deduplicator in deduplicators:
+                deduplicator.write_clusters(file)
+    if cache is not None:
+        print(f"Entity cache: {cache.stats()}")
+        cache.close()
+    if rollups is not None:
+        rollups.close()
+    if relevance_gate and match_mode == 'ner':
+        print(recall_report())
+    write_summary(sys.stdout)
+    metrics.close()
+
+    # index the counts so aggregate and plot can run, and be filtered, without fetching or NER
+    index = CountIndex.from_counter(counter)
+    if index_path:
+        index.save(index_path)
+    for commit in watermark_commits:
+        commit()
+    return index
+
+
+def enqueue(queue_path: str = 'data/work_queue.sqlite', unit_size: int = 64, dedup_scope: str = 'organization',
+            dedup_threshold: float = 0.9) -> None:
+    from src.deduplication import Deduplicator, drop_duplicates
+    from src.work_queue import WorkQueue
+
+    # load and deduplicate every source once, splitting the documents into units for the workers
+    queue = WorkQueue(queue_path)
+    deduplicator = None
+    for source in source_data():
+        if dedup_scope == 'organization' or (dedup_scope == 'all' and deduplicator is None):
+            deduplicator = Deduplicator(threshold=dedup_threshold)
+        documents = load_documents(source)
+        if dedup_scope != 'off':
+            documents = drop_duplicates(documents, deduplicator, source['Organization'])
+        units = queue.enqueue(source['Organization'], documents, unit_size=unit_size)
+        print(f"{source['Organization']}: {units} new units")
+    queue.close()
+
+
+def work(queue_path: str = 'data/work_queue.sqlite', shards_path: str = 'data/shards', workers: int = 1,
+         lease_seconds: float = 600.0, **annotator_options) -> None:
+    # run workers until the queue is drained; any number of them, on the machine that holds queue_path
+    if workers > 1:
+        import multiprocessing
+
+        processes = [multiprocessing.Process(target=work, args=(queue_path, shards_path, 1, lease_seconds),
+                                             kwargs=annotator_options) for _ in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        return
+
+    from src.work_queue import WorkQueue, worker_name, write_shard
+
+    queue = WorkQueue(queue_path, lease_seconds=lease_seconds)
+    cache_path = annotator_options.pop('cache_path', None)
+    cache = EntityCache(cache_path) if cache_path and annotator_options.get('match_mode', 'ner') == 'ner' else None
+    annotate = annotator(cache=cache, **annotator_options)
+    name = worker_name()
+    while (unit := queue.lease(name)) is not None:
+        unit_id, organization, unit_documents = unit
+        mentions, documents = [], []
+        for document in annotate(unit_documents):
+            documents.append((organization, document['doc_id'], document['date']))
+            mentions += [(organization, document['doc_id'], entity, count)
+                         for entity, count in Counter(document['entities']).items()]
+        # the shard is on disk before the unit is marked done, so a crash in between only repeats this unit
+        write_shard(shards_path, unit_id, mentions, documents)
+        if cache is not None:
+            cache.commit()
+        queue.complete(unit_id)
+        metrics.increment('work.units')
+    if cache is not None:
+        cache.close()
+    queue.close()
+
+
+def reduce(shards_path: str = 'data/shards', index_path: str = 'data/count_index') -> 'CountIndex':
+    from src.count_index import CountIndex
+    from src.work_queue import merge_shards, read_shards
+
+    # merge every worker's shards into the same count index extract would have built
+    index = CountIndex.from_records(*merge_shards(read_shards(shards_path)))
+    index.save(index_path)
+    return index
+
+
+def aggregate(index: 'CountIndex', output_path: str | None = None) -> None:
+    from src.aggregation import figure_data
+
+    # filter entities and organize into figure data
+    data = figure_data(index.mentions, index.documents_count(), classes)
+    if output_path:
+        data.to_csv(output_path, index=False)
+    else:
+        print(data.to_string(index=False))
+
+
+def trends(rollups_path: str = 'data/rollups.sqlite', period: str = 'week', by: str = 'class',
+           organizations: list[str] | None = None, start: str | None = None, end: str | None = None,
+           output_path: str | None = None) -> None:
+    import pandas
+
+    from src.rollups import MentionRollups
+
+    # mentions per bucket straight from the rollups, without touching the corpus or the count index
+    rollups = MentionRollups(rollups_path)
+    data = pandas.DataFrame(rollups.trend(period, by, organizations=organizations, start=start, end=end),
+                            columns=['Bucket', 'Organization', by.title(), 'Raw Count', 'Document Counts'])
+    rollups.close()
+    data['Mentions per Document'] = data['Raw Count'] / data['Document Counts']
+    if output_path:
+        data.to_csv(output_path, index=False)
+    else:
+        print(data.to_string(index=False))
+
+
+def plot(index: 'CountIndex', figures_path: str = 'figures', formats: Iterable[str] = ('png',),
+         panels: list[str] | None = None, workers: int = 4, show: bool = False) -> None:
+    from src.aggregation import (class_proportion_table, entity_proportion_table, figure_data,
+                                 mentions_per_document_table, raw_count_table)
 
     # filter entities and organize into figure data
-    data = {}
-    for source in source_entities:
-        for token, count in source["Counts"].items():
-            for class_name, class_members in classes.items():
-                for member, pseudonyms in class_members.items():
-                    if token.lower() in pseudonyms:
-                        if (member, source["Organization"]) not in data:
-                            data.update({(member, source["Organization"]): count})
-                        else:
-                            data.update(
-                                {(member, source["Organization"]): data[(member, source["Organization"])] + count})
-
-    data = pandas.DataFrame([(key[0], key[1], value) for key, value in data.items()],
-                            columns=['Class', 'Organization', 'Raw Count'])
-    data["Document Counts"] = data["Organization"].apply(
-        lambda x: {source["Organization"]: source["Documents Count"] for source in source_entities}[x])
-    data["Mentions per Document"] = data["Raw Count"] / data["Document Counts"]
-
-    data_counts = data[["Class", "Organization", "Raw Count"]].set_index(['Organization', 'Class'])[
-        "Raw Count"].unstack()
-    data_class_counts = data_counts.groupby(data_counts.columns.map(
-        dict(ChainMap(*[{item: class_ for item in list(classes[class_].keys())} for class_ in classes]))), axis=1).sum()
+    data = figure_data(index.mentions, index.documents_count(), classes)
+    if not show:
+        from src.rendering import render_panels
+
+        # write each panel to its own file without a display
+        for path in render_panels(data, classes, figures_path, formats=formats, names=panels, workers=workers):
+            print(f"Wrote {path}")
+        return
+
+    import seaborn
+    from matplotlib import pyplot
 
     # create a figure illustrating entity mentions across different organizations
     fig, axes = pyplot.subplots(2, 2, dpi=144, figsize=(18, 18))
-    seaborn.barplot(data, x="Class", y="Raw Count", hue="Organization", ax=axes[0][0])
-    seaborn.barplot(data, x="Class", y="Mentions per Document", hue="Organization", ax=axes[0][1])
-    data_counts.div(data_counts.sum(axis=1), axis=0).plot(kind='bar', stacked=True, ax=axes[1][0])
-    data_class_counts.div(data_class_counts.sum(axis=1), axis=0).plot(kind='bar', stacked=True, ax=axes[1][1])
+    seaborn.barplot(raw_count_table(data), x="Class", y="Raw Count", hue="Organization", ax=axes[0][0])
+    seaborn.barplot(mentions_per_document_table(data), x="Class", y="Mentions per Document", hue="Organization",
+                    ax=axes[0][1])
+    entity_proportion_table(data).plot(kind='bar', stacked=True, ax=axes[1][0])
+    class_proportion_table(data, classes).plot(kind='bar', stacked=True, ax=axes[1][1])
     axes[0][0].set_title("Raw Entity Mentions by Organization")
     axes[0][1].set_title("Mentions per Document by Organization")
     axes[1][0].set_title("Proportion of Entity Mentions by Organization")
@@ -135,8 +518,150 @@ def main():
     fig.suptitle("References to Chinese Entities by Organizations")
     pyplot.show()
 
-    return
+
+def main(show: bool = False, **kwargs):
+    # extract then plot, as a single run
+    plot(extract(**kwargs), show=show)
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Compare references to Chinese entities across organizations.")
+    parser.add_argument('command', nargs='?',
+                        choices=['fetch', 'extract', 'enqueue', 'work', 'reduce', 'serve', 'aggregate', 'plot',
+                                 'trends', 'all'],
+                        default='all', help="fetch sources into the archive, extract the entity count index, queue "
+                                            "documents for sharded extraction, run sharded workers, merge their "
+                                            "shards into the count index, serve a warm NER model, print the "
+                                            "aggregated table, plot the saved index, print mentions over time from "
+                                            "the rollups, or extract and plot (the default)")
+    parser.add_argument('--model', default="en_core_web_trf",
+                        help="spaCy model to use, e.g. en_core_web_sm or en_core_web_md for fast runs")
+    parser.add_argument('--batch-size', type=int, default=32, help="documents per spaCy batch")
+    parser.add_argument('--n-process', type=int, default=1, help="number of spaCy worker processes")
+    parser.add_argument('--match-mode', choices=['ner', 'aliases'], default='ner',
+                        help="find entities with spaCy or by matching class aliases directly in the text")
+    parser.add_argument('--relevance-gate', action='store_true',
+                        help="only pass sentences that mention a class alias, or sit next to one, to spaCy")
+    parser.add_argument('--relevance-context', type=int, default=1,
+                        help="sentences kept on either side of an alias hit by the relevance gate")
+    parser.add_argument('--relevance-recall', action='store_true',
+                        help="also run full NER to report how many entities the relevance gate loses")
+    parser.add_argument('--chunk-tokens', type=int, default=1000,
+                        help="split longer texts into overlapping windows of about this many words for NER (0 to off)")
+    parser.add_argument('--chunk-overlap', type=int, default=50, help="words repeated between consecutive windows")
+    parser.add_argument('--queue-size', type=int, default=64, help="documents buffered between pipeline stages")
+    parser.add_argument('--cache-path', default='data/entity_cache.sqlite',
+                        help="where to keep extracted entities between runs")
+    parser.add_argument('--no-cache', action='store_true', help="always run NER and do not touch the cache")
+    parser.add_argument('--rebuild-cache', action='store_true', help="discard cached entities before running")
+    parser.add_argument('--corpus-path', default='data/corpus', help="where to store documents and entity spans")
+    parser.add_argument('--index-path', default='data/count_index',
+                        help="where extract saves the entity count index and aggregate and plot read it")
+    parser.add_argument('--rollups-path', default='data/rollups.sqlite',
+                        help="where daily and weekly mention rollups are kept across runs")
+    parser.add_argument('--rebuild-rollups', action='store_true', help="discard the rollups before extracting")
+    parser.add_argument('--watermark-path', nargs='?', const='data/watermarks.json',
+                        help="only extract rss feed items that are new since the last successful run with this file")
+    parser.add_argument('--period', choices=['day', 'week'], default='week', help="bucket size for trends")
+    parser.add_argument('--by', choices=['class', 'member'], default='class',
+                        help="break trends down by entity class or by class member")
+    parser.add_argument('--max-entities', type=int,
+                        help="entities counted exactly; beyond this, new entities are only estimated in a sketch")
+    parser.add_argument('--ner-service', nargs='?', const='data/ner.sock',
+                        help="send documents to the NER service on this socket instead of loading a model")
+    parser.add_argument('--socket-path', default='data/ner.sock', help="where the serve command listens")
+    parser.add_argument('--max-latency', type=float, default=0.05,
+                        help="seconds the NER service waits to fill a batch before running a partial one")
+    parser.add_argument('--max-queued', type=int, default=256,
+                        help="documents the NER service holds before it stops reading from clients")
+    parser.add_argument('--queue-path', default='data/work_queue.sqlite', help="work queue for sharded extraction")
+    parser.add_argument('--shards-path', default='data/shards', help="where sharded workers write partial counts")
+    parser.add_argument('--unit-size', type=int, default=64, help="documents per sharded work unit")
+    parser.add_argument('--workers', type=int, default=1, help="worker processes started by the work command")
+    parser.add_argument('--lease-seconds', type=float, default=600.0,
+                        help="how long a work unit stays claimed before another worker may retry it")
+    parser.add_argument('--figures-path', default='figures', help="where plot writes one file per panel")
+    parser.add_argument('--formats', nargs='+', choices=['png', 'svg'], default=['png'], help="panel file formats")
+    parser.add_argument('--panels', nargs='+',
+                        choices=['raw_counts', 'mentions_per_document', 'entity_proportions', 'class_proportions'],
+                        help="only render these panels")
+    parser.add_argument('--render-workers', type=int, default=4, help="processes rendering panels in parallel")
+    parser.add_argument('--show', action='store_true',
+                        help="show the combined four panel figure in a window instead of writing files")
+    parser.add_argument('--organizations', nargs='+', help="only aggregate or plot these organizations")
+    parser.add_argument('--start', help="only aggregate or plot documents published on or after this day")
+    parser.add_argument('--end', help="only aggregate or plot documents published on or before this day")
+    parser.add_argument('--entities', nargs='+', help="only aggregate or plot these entities")
+    parser.add_argument('--output', help="write the aggregated or trend table to this csv file instead of printing it")
+    parser.add_argument('--dedup', choices=['organization', 'all', 'off'], default='organization',
+                        help="drop near-duplicate articles within each organization, across all of them, or not at all")
+    parser.add_argument('--dedup-threshold', type=float, default=0.9,
+                        help="estimated jaccard similarity above which two articles are duplicates")
+    parser.add_argument('--duplicates-path', help="write the clusters of dropped duplicates to this jsonl file")
+    parser.add_argument('--archive-path', default='data/responses', help="where to archive raw pages and pdfs")
+    parser.add_argument('--offline', action='store_true', help="only replay pages from the response archive")
+    parser.add_argument('--metrics-path', help="append per-stage counters and timings to this jsonl file")
+    parser.add_argument('--metrics-port', type=int, help="serve prometheus metrics on this port while running")
+    parser.add_argument('--profile', nargs='?', const='profiles',
+                        help="dump a cProfile of every stage to this directory")
+    arguments = parser.parse_args()
+
+    if arguments.metrics_path:
+        metrics.open_log(arguments.metrics_path)
+    if arguments.metrics_port:
+        serve_prometheus(arguments.metrics_port)
+    if arguments.command in ['fetch', 'extract', 'enqueue', 'all']:
+        from src.fetcher import configure as configure_fetcher
+        from src.response_archive import ResponseArchive
+
+        configure_fetcher(archive=ResponseArchive(arguments.archive_path), offline=arguments.offline)
+
+    if arguments.command == 'fetch':
+        fetch()
+    elif arguments.command in ['extract', 'all']:
+        index = extract(model=arguments.model, batch_size=arguments.batch_size, n_process=arguments.n_process,
+                         cache_path=None if arguments.no_cache else arguments.cache_path,
+                         rebuild_cache=arguments.rebuild_cache, queue_size=arguments.queue_size,
+                         match_mode=arguments.match_mode, corpus_path=arguments.corpus_path,
+                         profile_path=arguments.profile, dedup_scope=arguments.dedup,
+                         dedup_threshold=arguments.dedup_threshold, duplicates_path=arguments.duplicates_path,
+                         index_path=arguments.index_path, rollups_path=arguments.rollups_path,
+                         rebuild_rollups=arguments.rebuild_rollups, relevance_gate=arguments.relevance_gate,
+                         relevance_context=arguments.relevance_context, relevance_recall=arguments.relevance_recall,
+                         max_entities=arguments.max_entities, ner_service=arguments.ner_service,
+                         chunk_tokens=arguments.chunk_tokens, chunk_overlap=arguments.chunk_overlap,
+                         watermark_path=arguments.watermark_path)
+        if arguments.command == 'all':
+            plot(index, arguments.figures_path, formats=arguments.formats, panels=arguments.panels,
+                 workers=arguments.render_workers, show=arguments.show)
+    elif arguments.command == 'enqueue':
+        enqueue(arguments.queue_path, unit_size=arguments.unit_size, dedup_scope=arguments.dedup,
+                dedup_threshold=arguments.dedup_threshold)
+    elif arguments.command == 'work':
+        work(arguments.queue_path, arguments.shards_path, workers=arguments.workers,
+             lease_seconds=arguments.lease_seconds, model=arguments.model, batch_size=arguments.batch_size,
+             n_process=arguments.n_process, cache_path=None if arguments.no_cache else arguments.cache_path,
+             match_mode=arguments.match_mode, relevance_gate=arguments.relevance_gate,
+             relevance_context=arguments.relevance_context, ner_service=arguments.ner_service,
+             chunk_tokens=arguments.chunk_tokens, chunk_overlap=arguments.chunk_overlap)
+    elif arguments.command == 'serve':
+        serve(arguments.model, arguments.socket_path, batch_size=arguments.batch_size,
+              max_latency=arguments.max_latency, max_queue=arguments.max_queued,
+              cache_path=None if arguments.no_cache else arguments.cache_path)
+    elif arguments.command == 'reduce':
+        reduce(arguments.shards_path, arguments.index_path)
+    elif arguments.command == 'trends':
+        trends(arguments.rollups_path, period=arguments.period, by=arguments.by,
+               organizations=arguments.organizations, start=arguments.start, end=arguments.end,
+               output_path=arguments.output)
+    else:
+        from src import count_index
+
+        index = count_index.CountIndex.load(arguments.index_path).query(
+            organizations=arguments.organizations, start=arguments.start, end=arguments.end,
+            entities=arguments.entities)
+        if arguments.command == 'aggregate':
+            aggregate(index, output_path=arguments.output)
+        else:
+            plot(index, arguments.figures_path, formats=arguments.formats, panels=arguments.panels,
+                 workers=arguments.render_workers, show=arguments.show)
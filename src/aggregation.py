@@ -0,0 +1,57 @@
+from typing import Iterable
+
+import pandas
+
+from src.entity_matcher import compile_index
+
+
+def mentions_frame(rows: Iterable[tuple[str, int, str, int]]) -> pandas.DataFrame:
+    # long format (organization, doc_id, entity, count) table with compact dtypes
+    frame = pandas.DataFrame.from_records(rows, columns=['organization', 'doc_id', 'entity', 'count'])
+    return frame.astype({'organization': 'category', 'doc_id': 'int32', 'entity': 'category', 'count': 'int32'})
+
+
+def alias_frame(classes: dict[str, dict[str, list[str]]]) -> pandas.DataFrame:
+    return pandas.DataFrame([(alias, class_name, member) for alias, members in compile_index(classes).items()
+                             for class_name, member in members], columns=['alias', 'class', 'member'])
+
+
+def figure_data(mentions: pandas.DataFrame, documents_count: dict[str, int],
+                classes: dict[str, dict[str, list[str]]]) -> pandas.DataFrame:
+    # collapse to one row per (organization, entity) before touching strings, then join against the taxonomy
+    totals = mentions.groupby(['organization', 'entity'], observed=True, sort=False)['count'].sum().reset_index()
+    totals['alias'] = totals['entity'].astype(str).str.lower()
+    members = totals.merge(alias_frame(classes), on='alias')
+    data = members.groupby(['member', 'organization'], observed=True, sort=False)['count'].sum().reset_index()
+    data = data.rename(columns={'member': 'Class', 'organization': 'Organization', 'count': 'Raw Count'})
+    data = data.astype({'Class': str, 'Organization': str})
+
+    data["Document Counts"] = data["Organization"].map(documents_count)
+    data["Mentions per Document"] = data["Raw Count"] / data["Document Counts"]
+    return data
+
+
+def raw_count_table(data: pandas.DataFrame) -> pandas.DataFrame:
+    return data[["Class", "Organization", "Raw Count"]]
+
+
+def mentions_per_document_table(data: pandas.DataFrame) -> pandas.DataFrame:
+    return data[["Class", "Organization", "Mentions per Document"]]
+
+
+def entity_count_table(data: pandas.DataFrame) -> pandas.DataFrame:
+    # organizations by entity
+    return data.pivot(index='Organization', columns='Class', values='Raw Count')
+
+
+def entity_proportion_table(data: pandas.DataFrame) -> pandas.DataFrame:
+    counts = entity_count_table(data)
+    return counts.div(counts.sum(axis=1), axis=0)
+
+
+def class_proportion_table(data: pandas.DataFrame,
+                           classes: dict[str, dict[str, list[str]]]) -> pandas.DataFrame:
+    counts = entity_count_table(data)
+    member_classes = {member: class_name for class_name, members in classes.items() for member in members}
+    class_counts = counts.T.groupby(member_classes).sum().T
+    return class_counts.div(class_counts.sum(axis=1), axis=0)
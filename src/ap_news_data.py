@@ -1,29 +1,29 @@
-import re
-from xml.etree import ElementTree
+from typing import Callable, Iterator
 
+from src.instrumentation import metrics
+from src.rss_feed import feed_items
+from src.text_cleaning import clean_text as clean
 
+
+@metrics.timed('ap_news.clean_text')
 def clean_text(text: str) -> str:
-    expression = r'<\/?a.*?>|<figure>.*?<\/figure>|<\/?p>|<div.*?>.*?<\/div>|<\/?h\d.*?>|<\/?strong>'
-    return re.sub('\s+', ' ', re.sub(expression, ' ', text).strip())
+    return clean(text, 'html')
 
 
-def import_data_from_file(xml_file: str) -> list[dict[str: str]]:
-    tree = ElementTree.parse(xml_file)
-    root = tree.getroot()
-    articles = []
+def import_data_from_file(xml_file: str, watermark_path: str | None = None,
+                          commits: list[Callable[[], None]] | None = None) -> Iterator[dict[str, str]]:
+    # with a watermark file, only items that were not imported on an earlier run are returned; see feed_items
     article = {}
-    for item in root.findall('./channel/item'):
+    for item in feed_items(xml_file, watermark_path, commits=commits):
         for element in item:
             if element.tag != 'category':
                 article[element.tag] = clean_text(element.text)
-        articles.append(article.copy())
+        yield article.copy()
         article.clear()
 
-    return articles
-
 
 if __name__ == '__main__':
     # load from RSS feed
-    data = import_data_from_file("../data/apnews.xml")
+    data = list(import_data_from_file("../data/apnews.xml"))
 
     print("Complete.")
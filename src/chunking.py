@@ -0,0 +1,57 @@
+import bisect
+import re
+
+from src.relevance import sentence_spans
+
+_token = re.compile(r'\S+')
+
+
+def chunk_spans(text: str, max_tokens: int = 1000, overlap: int = 50) -> list[tuple[int, int]]:
+    # (start, end) windows of at most max_tokens whitespace tokens that end on sentence boundaries where possible and
+    # repeat up to overlap tokens of the previous window, so an entity on a boundary is seen whole at least once
+    tokens = [(token.start(), token.end()) for token in _token.finditer(text)]
+    if len(tokens) <= max_tokens:
+        return [(0, len(text))]
+
+    # sentences as token ranges; a sentence longer than a window (e.g. unpunctuated pdf text) is split into pieces of
+    # overlap tokens, so windows through it still overlap
+    token_starts = [start for start, _ in tokens]
+    piece_size = min(overlap, max_tokens) or max_tokens
+    boundaries = sorted({bisect.bisect_left(token_starts, start) for start, _ in sentence_spans(text)} | {0})
+    pieces = []
+    for first, last in zip(boundaries, boundaries[1:] + [len(tokens)]):
+        steps = range(first, last, piece_size) if last - first > max_tokens else [first]
+        pieces += [(step, min(step + piece_size, last) if len(steps) > 1 else last) for step in steps]
+
+    windows = []
+    first = 0
+    while True:
+        # pack whole pieces into the window until the next one would go over budget
+        last, size = first, pieces[first][1] - pieces[first][0]
+        while last + 1 < len(pieces) and size + pieces[last + 1][1] - pieces[last + 1][0] <= max_tokens:
+            last += 1
+            size += pieces[last][1] - pieces[last][0]
+        windows.append((tokens[pieces[first][0]][0], tokens[pieces[last][1] - 1][1]))
+        if last == len(pieces) - 1:
+            return windows
+
+        # the next window starts with the trailing pieces that fit in overlap tokens, but always moves forward
+        carried, first_next = 0, last + 1
+        while first_next - 1 > first and carried + pieces[first_next - 1][1] - pieces[first_next - 1][0] <= overlap:
+            first_next -= 1
+            carried += pieces[first_next][1] - pieces[first_next][0]
+        first = first_next
+
+
+def merge_spans(window_spans: list[tuple[int, list[tuple[str, str, int, int]]]]) -> list[tuple[str, str, int, int]]:
+    # shift each window's spans by the window's start and drop repeats from the overlaps; where spans overlap, the
+    # longer one wins, since a span cut off by a window edge is shorter than the same entity seen whole
+    spans = sorted({(text, label, start + offset, end + offset)
+                    for offset, window in window_spans for text, label, start, end in window},
+                   key=lambda span: (span[2], span[2] - span[3]))
+    merged = []
+    for span in spans:
+        if merged and span[2] < merged[-1][3]:
+            continue
+        merged.append(span)
+    return merged
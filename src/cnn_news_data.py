@@ -1,41 +1,43 @@
 import os
-import re
-from xml.etree import ElementTree
+from typing import Callable, Iterator
 
-import pandas
-import requests
-from bs4 import BeautifulSoup
-from requests_html import HTMLSession
-from tqdm import tqdm
+from src.crawler import crawl, path_prefixes
+from src.extraction import extract
+from src.fetcher import fetch, fetch_iter
+from src.instrumentation import metrics
+from src.rss_feed import feed_items
+from src.text_cleaning import clean_text as clean
 
 
+@metrics.timed('cnn.clean_text')
 def clean_text(text: str) -> str:
-    expression = r'<\/?a.*?>|<figure>.*?<\/figure>|<\/?p>|<div.*?>.*?<\/div>|<\/?h\d.*?>|<\/?strong>'
-    return re.sub('\s+', ' ', re.sub(expression, ' ', text).strip())
+    return clean(text, 'html')
 
 
-def import_data_from_file(xml_file: str) -> list[dict[str: str]]:
-    tree = ElementTree.parse(xml_file)
-    root = tree.getroot()
-    articles = []
+def import_data_from_file(xml_file: str, watermark_path: str | None = None,
+                          commits: list[Callable[[], None]] | None = None) -> Iterator[dict[str, str]]:
+    # with a watermark file, only items that were not imported on an earlier run are returned; see feed_items
     article = {}
-    for item in root.findall('./channel/item'):
+    for item in feed_items(xml_file, watermark_path, commits=commits):
         for element in item:
             # if element.tag
             if element.tag == '{http://purl.org/rss/1.0/modules/content/}encoded':
                 article['description'] = clean_text(element.text)
             elif element.tag in ['guid', 'title', 'pubDate']:
                 article[element.tag] = clean_text(element.text)
-        articles.append(article.copy())
+        yield article.copy()
         article.clear()
 
-    return articles
-
 
 def download_source_rss_feed(source: str, url: str, data_directory: str = 'data', force_download: bool = False) -> None:
     if os.path.exists(os.path.join(data_directory, source)) and not force_download:
         return
 
+    # requests_html pulls in pyppeteer and chromium support, so it is only imported when a feed is downloaded
+    import pandas
+    import requests
+    from requests_html import HTMLSession
+
     try:
         session = HTMLSession()
         response = session.get(url)
@@ -43,19 +45,18 @@ def download_source_rss_feed(source: str, url: str, data_directory: str = 'data'
         print(e)
         raise NotImplementedError
 
-    data = pandas.DataFrame(columns=['title', 'pubDate', 'guid', 'description'])
-
     items = response.html.find("item", first=False)
 
+    rows = []
     for item in items:
         title = item.find('title', first=True).text
         pubDate = item.find('pubDate', first=True).text
         guid = item.find('guid', first=True).text
         description = item.find('description', first=True).text
 
-        data = data.append({'title': title, 'pubData': pubDate, 'guid': guid, 'description': description},
-                           ignore_index=True)
+        rows.append({'title': title, 'pubDate': pubDate, 'guid': guid, 'description': description})
 
+    data = pandas.DataFrame(rows, columns=['title', 'pubDate', 'guid', 'description'])
     data.to_csv(os.path.join(data_directory, source))
 
     return
@@ -65,20 +66,25 @@ def analyze_source(source: str) -> dict:
     raise NotImplementedError
 
 
+@metrics.timed('cnn.parse_page')
 def parse_page(url: str) -> str:
     # get html from url and parse
-    html_doc = requests.get(url).text
-    soup = BeautifulSoup(html_doc, 'html.parser')
-    content = soup.find('div', class_='article__content')
-    if not content:
-        content = soup.find('div', class_='Article__content')
-    if content:
-        return content.text
-    else:
-        return ''
-
-
-def manual_import(*args):
+    return parse_html(fetch(url).text)
+
+
+@metrics.timed('cnn.parse_html')
+def parse_html(html_doc: str) -> str:
+    _, content = parse_article(html_doc)
+    return content
+
+
+@metrics.timed('cnn.parse_article')
+def parse_article(html_doc: str) -> tuple[str | None, str]:
+    # publication date and body, as crawl expects
+    return extract(html_doc, 'cnn')
+
+
+def manual_import(*args) -> Iterator[dict[str, str]]:
     links = [
         "https://www.cnn.com/2023/04/15/asia/taiwan-china-invasion-defense-us-weapons-intl-hnk-dst/index.html",
         "https://www.cnn.com/2023/03/24/asia/taiwan-diplomatic-allies-support-analysis-intl-hnk-dst/index.html",
@@ -112,36 +118,20 @@ def manual_import(*args):
         "https://www.cnn.com/2023/04/03/politics/chinese-spy-balloon/index.html",
     ]
 
-    texts = []
-    for link in links:
-        texts.append({"url": link, "content": clean_text(parse_page(link))})
-
-    return texts
-
-
-def import_data(url: str) -> list[dict[str, str]]:
-    # get html from url and parse
-    html_doc = requests.get(url).text
-    soup = BeautifulSoup(html_doc, 'html.parser')
+    for link, response in zip(links, fetch_iter(links)):
+        yield {"url": link, "content": clean_text(parse_html(response.text))}
 
-    # check each href in html for pdfs
-    urls = []
-    contents = []
-    for link in tqdm(soup.find_all('a')):
-        href = link.get('href')
-        if href and (href.lower().startswith('/world/') or href.lower().startswith('/politics/')):
-            href = "https://www.foxnews.com" + href
-            content = clean_text(parse_page(href))
-            if 'china' in content.lower() and content not in contents:
-                urls.append(href)
-                contents.append(content)
 
-    return [{"url": href, "content": content} for href, content in zip(urls, contents)]
+def import_data(url: str, max_depth: int = 1, max_pages: int = 1000) -> Iterator[dict[str, str]]:
+    # crawl world and politics articles out from the index page at url, keeping those that mention china
+    yield from crawl([url], follow=path_prefixes('/world/', '/politics/'), parse=parse_article, clean=clean_text,
+                     keep=lambda content: 'china' in content.lower(), max_depth=max_depth, max_pages=max_pages,
+                     allowed_domains=['www.cnn.com'])
 
 
 def main():
     # load from manual links
-    manual_import()
+    list(manual_import())
 
 
 if __name__ == '__main__':
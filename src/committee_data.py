@@ -1,44 +1,92 @@
+import os
 import re
-from io import BytesIO
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from tempfile import TemporaryDirectory
+from typing import Iterator
 
-import requests
 from PyPDF2 import PdfReader
 from bs4 import BeautifulSoup
 
+from src.fetcher import fetch, fetch_file, fetch_files
+from src.instrumentation import metrics
+from src.text_cleaning import clean_text as clean
+
+# pages slower than this are reported so pathological files can be tracked down
+slow_page_seconds = 5.0
+
+
+def clean_page(text: str) -> str:
+    return re.sub(r'\s+', ' ', re.sub(r'\n|1 http.*', ' ', text)).strip()
+
+
+def extract_pages(pdf_path: str, start: int, end: int) -> list[tuple[int, str, float]]:
+    # runs in a worker process, so only the path and page range cross the process boundary
+    reader = PdfReader(pdf_path)
+    pages = []
+    for page_number in range(start, min(end, len(reader.pages))):
+        started = time.perf_counter()
+        text = clean_page(reader.pages[page_number].extract_text())
+        pages.append((page_number, text, time.perf_counter() - started))
+
+    return pages
 
-def parse_pdf(pdf_url: str) -> str:
-    pdf_file = requests.get(pdf_url)
-    bytes_stream = BytesIO(pdf_file.content)
-    reader = PdfReader(bytes_stream)
-    pdf_text = ''
-    for page in reader.pages:
-        pdf_text += re.sub(r'\s+', ' ', re.sub(r'\n|1 http.*', ' ', page.extractText())).strip()
 
-    return pdf_text
+def submit_pdf(executor: Executor, pdf_path: str, pages_per_task: int = 8) -> list[Future]:
+    page_count = len(PdfReader(pdf_path).pages)
+    return [executor.submit(extract_pages, pdf_path, start, start + pages_per_task)
+            for start in range(0, page_count, pages_per_task)]
+
+
+def collect_pdf(pdf_url: str, futures: list[Future]) -> tuple[str, list[float]]:
+    pages = [page for future in futures for page in future.result()]
+    for page_number, _, seconds in pages:
+        # pages are timed in the worker processes, so record them here
+        metrics.observe('committee.pdf_page', seconds)
+        if seconds > slow_page_seconds:
+            print(f"Slow page {page_number} ({seconds:.1f}s) in {pdf_url}")
+
+    # join once at the end instead of growing a string page by page
+    return ''.join(text for _, text, _ in pages), [seconds for _, _, seconds in pages]
+
+
+@metrics.timed('committee.parse_pdf')
+def parse_pdf(pdf_url: str) -> str:
+    with TemporaryDirectory() as directory:
+        pdf_path = os.path.join(directory, 'document.pdf')
+        fetch_file(pdf_url, pdf_path)
+        return ''.join(text for _, text, _ in extract_pages(pdf_path, 0, len(PdfReader(pdf_path).pages)))
 
 
+@metrics.timed('committee.clean_text')
 def clean_text(text: str) -> str:
-    expression = r'<\/?a.*?>|<figure>.*?<\/figure>|<\/?p>|<div.*?>.*?<\/div>|<\/?h\d.*?>'
-    return re.sub('\s+', ' ', re.sub(expression, ' ', text).strip())
+    return clean(text, 'committee')
 
 
-def import_data(url: str) -> list[dict[str, str]]:
+def import_data(url: str, max_workers: int | None = None, pages_per_task: int = 8) -> Iterator[dict[str, str]]:
     # get html from url and parse
-    html_doc = requests.get(url).text
+    html_doc = fetch(url).text
     soup = BeautifulSoup(html_doc, 'html.parser')
 
     # check each href in html for pdfs
-    pdf_data = []
+    pdf_urls = []
     for link in soup.find_all('a'):
         href = link.get('href')
         if href and href.lower().endswith('.pdf'):
-            pdf_data.append({"url": href, "content": clean_text(parse_pdf(href))})
+            pdf_urls.append(href)
 
-    return pdf_data
+    # download to temporary files and fan the pages of every pdf out across worker processes as they arrive
+    with TemporaryDirectory() as directory, ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pdf_paths = [os.path.join(directory, f'{index}.pdf') for index in range(len(pdf_urls))]
+        jobs = [(href, submit_pdf(executor, pdf_path, pages_per_task))
+                for href, pdf_path, _ in zip(pdf_urls, pdf_paths, fetch_files(pdf_urls, pdf_paths))]
+        for href, futures in jobs:
+            pdf_text, page_seconds = collect_pdf(href, futures)
+            yield {"url": href, "content": clean_text(pdf_text), "page_seconds": page_seconds}
 
 
 if __name__ == '__main__':
-    data = import_data(
-        "https://selectcommitteeontheccp.house.gov/committee-activity/hearings/chinese-communist-partys-threat-america")
+    data = list(import_data(
+        "https://selectcommitteeontheccp.house.gov/committee-activity/hearings/chinese-communist-partys-threat-america"))
 
     print("Complete.")
@@ -0,0 +1,88 @@
+import os
+import shutil
+import uuid
+from typing import Iterable, Iterator
+
+import pandas
+import pyarrow
+import pyarrow.dataset
+import pyarrow.parquet
+
+from src.dates import published_day
+
+schema = pyarrow.schema([
+    ('organization', pyarrow.string()),
+    ('date', pyarrow.string()),
+    ('doc_id', pyarrow.int32()),
+    ('url', pyarrow.string()),
+    ('published', pyarrow.string()),
+    ('text', pyarrow.string()),
+    ('spans', pyarrow.list_(pyarrow.struct([('text', pyarrow.string()), ('label', pyarrow.string()),
+                                            ('start', pyarrow.int32()), ('end', pyarrow.int32())])))
+])
+
+partition_columns = ['organization', 'date']
+
+
+def partition_dates(published: list[str | None]) -> list[str]:
+    # day partitions, with documents whose publication date is missing or unparseable kept together
+    return [day.isoformat() if (day := published_day(date)) else 'unknown' for date in published]
+
+
+class CorpusWriter:
+    def __init__(self, root: str, organization: str, batch_size: int = 1024):
+        self.root = root
+        self.organization = organization
+        self.batch_size = batch_size
+        self.batch = []
+
+        # replace whatever an earlier run stored for this organization
+        for name in [f'organization={organization}', f'organization={organization.replace(" ", "%20")}']:
+            if os.path.isdir(os.path.join(root, name)):
+                shutil.rmtree(os.path.join(root, name))
+
+    def write(self, document: dict) -> None:
+        self.batch.append(document)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.batch:
+            return
+        table = pyarrow.Table.from_pydict({
+            'organization': [self.organization] * len(self.batch),
+            'date': partition_dates([document['date'] for document in self.batch]),
+            'doc_id': [document['doc_id'] for document in self.batch],
+            'url': [document['url'] for document in self.batch],
+            'published': [document['date'] for document in self.batch],
+            'text': [document['text'] for document in self.batch],
+            'spans': [[{'text': text, 'label': label, 'start': start, 'end': end}
+                       for text, label, start, end in document['spans']] for document in self.batch]
+        }, schema=schema)
+        pyarrow.dataset.write_dataset(
+            table, self.root, format='parquet', partitioning=partition_columns, partitioning_flavor='hive',
+            basename_template=f'part-{uuid.uuid4().hex}-{{i}}.parquet', existing_data_behavior='overwrite_or_ignore',
+            file_options=pyarrow.dataset.ParquetFileFormat().make_write_options(compression='zstd'))
+        self.batch.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+
+
+def write_corpus(documents: Iterable[dict], root: str, organization: str) -> Iterator[dict]:
+    # pass documents through unchanged while storing them in the corpus
+    with CorpusWriter(root, organization) as writer:
+        for document in documents:
+            writer.write(document)
+            yield document
+
+
+def load_corpus(root: str = 'data/corpus', columns: list[str] | None = None,
+                filters: list[tuple] | None = None) -> pandas.DataFrame:
+    # e.g. load_corpus(columns=['url', 'date'], filters=[('organization', '=', 'Reuters'), ('date', '>=', '2023-04')])
+    # only the requested columns are decoded, and partitions or row groups that cannot match are skipped
+    return pyarrow.parquet.read_table(root, columns=columns, filters=filters, memory_map=True,
+                                      partitioning='hive').to_pandas()
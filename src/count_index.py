@@ -0,0 +1,95 @@
+import os
+from typing import Iterable
+
+import numpy
+import pandas
+
+from src.dates import published_day
+from src.entity_counts import EntityCounter
+from src.entity_matcher import normalize
+
+
+def document_dates(published: Iterable[str | None]) -> pandas.Series:
+    # publication day as a naive timestamp, NaT when missing or unparseable. a column that mixes strings and missing
+    # dates holds NaN floats for the missing ones, so anything that is not a string counts as missing
+    days = pandas.Series([published_day(date) if isinstance(date, str) else None for date in published], dtype=object)
+    return pandas.to_datetime(days).astype('datetime64[ns]')
+
+
+class CountIndex:
+    def __init__(self, mentions: pandas.DataFrame, documents: pandas.DataFrame):
+        # mentions: one row per (organization, doc_id, date, entity) with its count
+        # documents: one row per (organization, doc_id, date), so documents without any mentions are still counted
+        self.mentions = mentions
+        self.documents = documents
+
+    @classmethod
+    def from_records(cls, mentions: Iterable[tuple[str, int, str, int]],
+                     documents: Iterable[tuple[str, int, str | None]]) -> 'CountIndex':
+        documents = pandas.DataFrame.from_records(documents, columns=['organization', 'doc_id', 'published'])
+        documents['date'] = document_dates(documents.pop('published'))
+        documents = documents.astype({'organization': 'category', 'doc_id': 'int32'})
+
+        mentions = pandas.DataFrame.from_records(mentions, columns=['organization', 'doc_id', 'entity', 'count'])
+        mentions['entity'] = mentions['entity'].map(normalize)
+        mentions = mentions.astype({'organization': documents['organization'].dtype, 'doc_id': 'int32'})
+        # different spellings of one entity collapse into one row once normalized
+        mentions = mentions.merge(documents, on=['organization', 'doc_id'], how='left') \
+            .groupby(['organization', 'doc_id', 'date', 'entity'], observed=True, sort=False, dropna=False)['count'] \
+            .sum().reset_index()
+        mentions = mentions.astype({'entity': 'category', 'count': 'int32'})
+        return cls(mentions[['organization', 'doc_id', 'date', 'entity', 'count']], documents)
+
+    @classmethod
+    def from_counter(cls, counter: EntityCounter) -> 'CountIndex':
+        # straight from the counter's interned ids and coordinate arrays, without a python object per mention
+        organizations = numpy.frombuffer(counter.document_organizations, dtype=numpy.int32)
+        doc_ids = numpy.frombuffer(counter.document_ids, dtype=numpy.int32)
+        documents = pandas.DataFrame({
+            'organization': pandas.Categorical.from_codes(organizations, categories=counter.organizations),
+            'doc_id': doc_ids,
+            'date': document_dates(counter.document_dates).to_numpy()
+        })
+
+        rows = numpy.frombuffer(counter.rows, dtype=numpy.int32)
+        mentions = pandas.DataFrame({
+            'organization': pandas.Categorical.from_codes(organizations[rows], categories=counter.organizations),
+            'doc_id': doc_ids[rows],
+            'date': documents['date'].to_numpy()[rows],
+            'entity': pandas.Categorical.from_codes(numpy.frombuffer(counter.columns, dtype=numpy.int32),
+                                                    categories=counter.entities),
+            'count': numpy.frombuffer(counter.values, dtype=numpy.int32)
+        })
+        return cls(mentions, documents)
+
+    def save(self, path: str = 'data/count_index') -> None:
+        os.makedirs(path, exist_ok=True)
+        self.mentions.to_parquet(os.path.join(path, 'mentions.parquet'), compression='zstd', index=False)
+        self.documents.to_parquet(os.path.join(path, 'documents.parquet'), compression='zstd', index=False)
+
+    @classmethod
+    def load(cls, path: str = 'data/count_index') -> 'CountIndex':
+        return cls(pandas.read_parquet(os.path.join(path, 'mentions.parquet')),
+                   pandas.read_parquet(os.path.join(path, 'documents.parquet')))
+
+    def query(self, organizations: list[str] | None = None, start: str | None = None, end: str | None = None,
+              entities: Iterable[str] | None = None) -> 'CountIndex':
+        # e.g. index.query(organizations=['CNN', 'Reuters'], start='2023-04-01', entities=['xi jinping', 'ccp'])
+        # start and end are inclusive days; a date filter drops documents without a publication date
+        def keep(frame: pandas.DataFrame) -> pandas.Series:
+            mask = pandas.Series(True, index=frame.index)
+            if organizations is not None:
+                mask &= frame['organization'].isin(organizations)
+            if start is not None:
+                mask &= frame['date'] >= pandas.Timestamp(start)
+            if end is not None:
+                mask &= frame['date'] <= pandas.Timestamp(end)
+            return mask
+
+        mentions = self.mentions[keep(self.mentions)]
+        if entities is not None:
+            mentions = mentions[mentions['entity'].isin([normalize(entity) for entity in entities])]
+        return CountIndex(mentions, self.documents[keep(self.documents)])
+
+    def documents_count(self) -> dict[str, int]:
+        return self.documents.groupby('organization', observed=True)['doc_id'].size().to_dict()
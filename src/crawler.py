@@ -0,0 +1,122 @@
+import hashlib
+import math
+from typing import Callable, Iterable, Iterator
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from src.fetcher import fetch_iter
+from src.instrumentation import metrics
+
+# query parameters that only track where a click came from
+tracking_parameters = ('utm_', 'fbclid', 'gclid', 'cmpid', 'ftag', 'taid')
+
+
+def normalize_url(url: str, base: str | None = None) -> str | None:
+    # absolute, lower-case host, no fragment, default port or tracking parameters, so one article has one url
+    url = urljoin(base, url) if base else url
+    parts = urlsplit(url)
+    if parts.scheme not in ['http', 'https']:
+        return None
+    host = parts.hostname or ''
+    if parts.port and parts.port != {'http': 80, 'https': 443}[parts.scheme]:
+        host = f'{host}:{parts.port}'
+    query = urlencode(sorted((key, value) for key, value in parse_qsl(parts.query)
+                             if not key.lower().startswith(tracking_parameters)))
+    return urlunsplit((parts.scheme, host, parts.path or '/', query, ''))
+
+
+def digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        # sized for capacity items at the given false positive rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> Iterator[int]:
+        value = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(value[:8], 'little'), int.from_bytes(value[8:], 'little')
+        for index in range(self.hashes):
+            yield (first + index * second) % self.size
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position // 8] & (1 << (position % 8)) for position in self._positions(item))
+
+
+class SeenSet:
+    def __init__(self):
+        # 8 byte digests rather than whole urls
+        self.digests = set()
+
+    def add(self, item: str) -> None:
+        self.digests.add(digest(item))
+
+    def __contains__(self, item: str) -> bool:
+        return digest(item) in self.digests
+
+
+def page_links(html_doc: str, base: str) -> Iterator[str]:
+    soup = BeautifulSoup(html_doc, 'html.parser', parse_only=SoupStrainer('a'))
+    for link in soup.find_all('a'):
+        href = link.get('href')
+        if href and (url := normalize_url(href, base)):
+            yield url
+
+
+def path_prefixes(*prefixes: str) -> Callable[[str], bool]:
+    # follow only links whose path starts with one of the prefixes, e.g. path_prefixes('/world/', '/politics/')
+    prefixes = tuple(prefix.lower() for prefix in prefixes)
+    return lambda url: urlsplit(url).path.lower().startswith(prefixes)
+
+
+def crawl(seeds: Iterable[str], follow: Callable[[str], bool], parse: Callable[[str], tuple[str | None, str]],
+          clean: Callable[[str], str] = lambda content: content, keep: Callable[[str], bool] = lambda content: True,
+          max_depth: int = 1, max_pages: int = 1000,
+          allowed_domains: list[str] | None = None, bloom_capacity: int | None = None) -> Iterator[dict]:
+    # breadth first from the seed pages; every level of the frontier is fetched concurrently by the shared fetcher
+    seen = BloomFilter(bloom_capacity) if bloom_capacity else SeenSet()
+    contents = SeenSet()
+    frontier = []
+    for seed in seeds:
+        if (url := normalize_url(seed)) and url not in seen:
+            seen.add(url)
+            frontier.append(url)
+    pages = 0
+
+    for depth in range(max_depth + 1):
+        frontier = frontier[:max_pages - pages]
+        next_frontier = []
+        for url, response in zip(frontier, fetch_iter(frontier)):
+            pages += 1
+            metrics.increment('crawl.pages')
+            html_doc = response.text
+            if depth < max_depth:
+                for link in page_links(html_doc, url):
+                    if link not in seen and follow(link) and \
+                            (allowed_domains is None or urlsplit(link).hostname in allowed_domains):
+                        seen.add(link)
+                        next_frontier.append(link)
+
+            # seed pages are indexes, not articles
+            if depth == 0:
+                continue
+            date, content = parse(html_doc)
+            content = clean(content)
+            # compare 8 byte content digests instead of whole article texts
+            if keep(content) and content not in contents:
+                contents.add(content)
+                yield {"url": url, "date": date, "content": content, "depth": depth}
+            else:
+                metrics.increment('crawl.skipped')
+
+        frontier = next_frontier
+        if not frontier or pages >= max_pages:
+            break
@@ -0,0 +1,32 @@
+import re
+from datetime import date, datetime
+from email.utils import parsedate_to_datetime
+
+# fox article pages print e.g. " April 15, 2023 3:22pm EDT"
+_fox_formats = ['%B %d, %Y %I:%M%p', '%B %d, %Y']
+_zone_name = re.compile(r'\s+[A-Z]{2,5}$')
+
+
+def published_day(published: str | None) -> date | None:
+    # the day a document was published, in the publisher's own time zone, or None when missing or unparseable.
+    # rss feeds give RFC 822 dates, Reuters page metadata ISO 8601 ones and Fox pages the format above, so one
+    # collection can mix all three and each date is parsed on its own
+    if not published or not published.strip():
+        return None
+    published = published.strip()
+    try:
+        return parsedate_to_datetime(published).date()
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(published.replace('Z', '+00:00')).date()
+    except ValueError:
+        pass
+    # strptime's %Z only knows utc and the local zone, so the zone name is dropped; the day is as printed either way
+    published = _zone_name.sub('', published)
+    for date_format in _fox_formats:
+        try:
+            return datetime.strptime(published, date_format).date()
+        except ValueError:
+            pass
+    return None
@@ -0,0 +1,106 @@
+import json
+import re
+import zlib
+from typing import Hashable, Iterable, Iterator, TextIO
+
+import numpy
+
+from src.instrumentation import metrics
+
+# hashes are taken modulo a mersenne prime below 2**32 so a * hash + b never overflows 64 bits
+_prime = (1 << 31) - 1
+
+_word = re.compile(r'\w+')
+
+
+def shingles(text: str, size: int = 5) -> numpy.ndarray:
+    # 32 bit hashes of every run of size words, so reordering or rewording a sentence only changes a few of them;
+    # empty for a text of fewer than size words
+    words = _word.findall(text.lower())
+    return numpy.unique(numpy.fromiter((zlib.crc32(' '.join(words[i:i + size]).encode('utf-8'))
+                                        for i in range(len(words) - size + 1)), dtype=numpy.uint64))
+
+
+def band_layout(num_perm: int, threshold: float) -> tuple[int, int]:
+    # (bands, rows) whose s-curve, (1 / bands) ** (1 / rows), sits closest to the threshold
+    layouts = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    return min(layouts, key=lambda layout: abs((1 / layout[0]) ** (1 / layout[1]) - threshold))
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        random = numpy.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.a = random.integers(1, _prime, num_perm, dtype=numpy.uint64)
+        self.b = random.integers(0, _prime, num_perm, dtype=numpy.uint64)
+
+    def signature(self, text: str) -> numpy.ndarray | None:
+        # one row per shingle, one column per permutation, and the minimum of each column; None without any shingles
+        hashes = shingles(text, self.shingle_size) % _prime
+        if not len(hashes):
+            return None
+        return ((numpy.outer(hashes, self.a) + self.b) % _prime).min(axis=0).astype(numpy.uint32)
+
+
+class Deduplicator:
+    def __init__(self, threshold: float = 0.9, num_perm: int = 128, shingle_size: int = 5):
+        # documents whose estimated jaccard similarity is at least threshold are duplicates
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self.bands, self.rows = band_layout(num_perm, threshold)
+        self.buckets = [{} for _ in range(self.bands)]
+        self.signatures = {}
+        self.duplicates = {}
+
+    def _band_keys(self, signature: numpy.ndarray) -> Iterator[bytes]:
+        for band in range(self.bands):
+            yield signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def add(self, key: Hashable, text: str) -> Hashable | None:
+        # returns the earlier document this one duplicates, or None after indexing it as a new original
+        signature = self.hasher.signature(text)
+        if signature is None:
+            # too short to compare (e.g. a pdf without a text layer), so passed on and never matched against
+            metrics.increment('dedup.too_short')
+            return None
+        band_keys = list(self._band_keys(signature))
+        candidates = {candidate for band, band_key in enumerate(band_keys)
+                      for candidate in self.buckets[band].get(band_key, ())}
+        metrics.increment('dedup.candidates', len(candidates))
+        best, best_similarity = None, self.threshold
+        for candidate in candidates:
+            similarity = float(numpy.mean(self.signatures[candidate] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = candidate, similarity
+        if best is not None:
+            self.duplicates[key] = best
+            metrics.increment('dedup.duplicates')
+            return best
+
+        # only originals are indexed, so every duplicate points straight at the first copy seen
+        self.signatures[key] = signature
+        for band, band_key in enumerate(band_keys):
+            self.buckets[band].setdefault(band_key, []).append(key)
+        return None
+
+    def clusters(self) -> dict[Hashable, list[Hashable]]:
+        # original -> the duplicates that were dropped in its favour
+        clusters = {}
+        for duplicate, original in self.duplicates.items():
+            clusters.setdefault(original, []).append(duplicate)
+        return clusters
+
+    def write_clusters(self, file: TextIO) -> None:
+        # one json line per cluster
+        for original, duplicates in self.clusters().items():
+            file.write(json.dumps({'original': original, 'duplicates': duplicates}) + '\n')
+
+
+def drop_duplicates(documents: Iterable[dict], deduplicator: Deduplicator, organization: str) -> Iterator[dict]:
+    # pass on only documents that are not near copies of one already seen, within or across organizations
+    for document in documents:
+        with metrics.timer('dedup.document'):
+            original = deduplicator.add((organization, document['url']), document['text'])
+        if original is None:
+            yield document
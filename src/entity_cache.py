@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+def model_version(nlp) -> str:
+    # e.g. en_core_web_trf-3.5.0
+    return f"{nlp.meta['lang']}_{nlp.meta['name']}-{nlp.meta['version']}"
+
+
+def document_key(text: str, model: str, labels: list[str]) -> str:
+    # content-addressed key so any change to the text, model or label filter misses the cache
+    digest = hashlib.sha256()
+    for part in [text, model, ','.join(sorted(labels))]:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class EntityCache:
+    def __init__(self, path: str = 'data/entity_cache.sqlite', max_entries: int = 100_000, rebuild: bool = False):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.used = {}
+        # several worker processes can share one cache file: with WAL, readers never wait on a writer, and a writer
+        # waits for the others' batches to commit rather than failing
+        self.connection = sqlite3.connect(path, timeout=60.0, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        if rebuild:
+            self.connection.execute("DROP TABLE IF EXISTS entities")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS entities "
+                                "(key TEXT PRIMARY KEY, spans TEXT NOT NULL, last_used REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS entities_last_used ON entities (last_used)")
+        self.connection.commit()
+
+    def get(self, key: str) -> list[tuple[str, str, int, int]] | None:
+        row = self.connection.execute("SELECT spans FROM entities WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # recorded here and written on the next commit, so a lookup never takes the write lock
+        self.used[key] = time.time()
+        return [tuple(span) for span in json.loads(row[0])]
+
+    def put(self, key: str, spans: list[tuple[str, str, int, int]]) -> None:
+        self.connection.execute("INSERT OR REPLACE INTO entities (key, spans, last_used) VALUES (?, ?, ?)",
+                                (key, json.dumps(spans), time.time()))
+
+    def evict(self) -> int:
+        # drop the least recently used entries beyond the size bound
+        (count,) = self.connection.execute("SELECT COUNT(*) FROM entities").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self.connection.execute("DELETE FROM entities WHERE key IN "
+                                    "(SELECT key FROM entities ORDER BY last_used LIMIT ?)", (excess,))
+        return max(excess, 0)
+
+    def stats(self) -> dict[str, int | float]:
+        (count,) = self.connection.execute("SELECT COUNT(*) FROM entities").fetchone()
+        lookups = self.hits + self.misses
+        return {"entries": count, "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def commit(self) -> None:
+        # lets long runs persist what they have so far, e.g. after each parsed batch
+        self.connection.executemany("UPDATE entities SET last_used = ? WHERE key = ?",
+                                    [(last_used, key) for key, last_used in self.used.items()])
+        self.used.clear()
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.commit()
+        self.evict()
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,115 @@
+import hashlib
+from array import array
+from collections import Counter
+from typing import Iterable
+
+import numpy
+
+from src.entity_matcher import normalize
+from src.instrumentation import metrics
+
+
+class CountMinSketch:
+    def __init__(self, width: int = 1 << 16, depth: int = 4):
+        # estimates never undercount, and overcount by at most total / width with probability 1 - e ** -depth
+        self.width = width
+        self.depth = depth
+        self.table = numpy.zeros((depth, width), dtype=numpy.int64)
+        self.rows = numpy.arange(depth)
+
+    def _columns(self, item: str) -> numpy.ndarray:
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=8 * self.depth).digest()
+        return numpy.frombuffer(digest, dtype=numpy.uint64) % self.width
+
+    def add(self, item: str, count: int = 1) -> None:
+        self.table[self.rows, self._columns(item)] += count
+
+    def estimate(self, item: str) -> int:
+        return int(self.table[self.rows, self._columns(item)].min())
+
+
+class EntityCounter:
+    def __init__(self, max_entities: int | None = None, reserved: Iterable[str] = (), sketch_width: int = 1 << 16,
+                 sketch_depth: int = 4):
+        # entities are interned to integer ids; once max_entities are interned, further new entities are only
+        # counted approximately in a count-min sketch, which bounds the vocabulary. the per-document coordinates
+        # below still grow with every document and the distinct interned entities it mentions.
+        # reserved entities (e.g. the class aliases) are interned up front and always counted exactly
+        self.max_entities = max_entities
+        self.entity_ids = {}
+        self.entities = []
+        self.totals = numpy.zeros(1024, dtype=numpy.int64)
+        self.sketch = CountMinSketch(sketch_width, sketch_depth) if max_entities is not None else None
+        self.organization_ids = {}
+        self.organizations = []
+
+        # one entry per document
+        self.document_organizations = array('i')
+        self.document_ids = array('i')
+        self.document_dates = []
+
+        # sparse document x entity counts in coordinate form
+        self.rows = array('i')
+        self.columns = array('i')
+        self.values = array('i')
+
+        for entity in reserved:
+            self.intern(normalize(entity), force=True)
+
+    def intern(self, entity: str, force: bool = False) -> int | None:
+        entity_id = self.entity_ids.get(entity)
+        if entity_id is not None or (not force and self.max_entities is not None and
+                                     len(self.entities) >= self.max_entities):
+            return entity_id
+        entity_id = self.entity_ids[entity] = len(self.entities)
+        self.entities.append(entity)
+        if entity_id >= len(self.totals):
+            self.totals = numpy.concatenate([self.totals, numpy.zeros_like(self.totals)])
+        return entity_id
+
+    def add_document(self, organization: str, doc_id: int, date: str | None, entities: Iterable[str]) -> None:
+        if organization not in self.organization_ids:
+            self.organization_ids[organization] = len(self.organizations)
+            self.organizations.append(organization)
+        row = len(self.document_ids)
+        self.document_organizations.append(self.organization_ids[organization])
+        self.document_ids.append(doc_id)
+        self.document_dates.append(date)
+
+        counts = Counter()
+        for entity in entities:
+            entity = normalize(entity)
+            entity_id = self.intern(entity)
+            if entity_id is None:
+                self.sketch.add(entity)
+                metrics.increment('counts.sketched_mentions')
+            else:
+                counts[entity_id] += 1
+        if counts:
+            columns = numpy.fromiter(counts.keys(), dtype=numpy.int64, count=len(counts))
+            values = numpy.fromiter(counts.values(), dtype=numpy.int64, count=len(counts))
+            self.totals[columns] += values
+            self.rows.extend([row] * len(counts))
+            self.columns.extend(columns.tolist())
+            self.values.extend(values.tolist())
+
+    def count(self, entity: str) -> int:
+        # exact for interned entities, a count-min estimate for the rest
+        entity = normalize(entity)
+        if entity in self.entity_ids:
+            return int(self.totals[self.entity_ids[entity]])
+        return self.sketch.estimate(entity) if self.sketch is not None else 0
+
+    def top(self, k: int = 20) -> list[tuple[str, int]]:
+        totals = self.totals[:len(self.entities)]
+        order = numpy.argsort(-totals, kind='stable')[:k]
+        return [(self.entities[index], int(totals[index])) for index in order]
+
+    def document_matrix(self):
+        # scipy.sparse csr matrix with a row per document (in the order they were added) and a column per entity id
+        from scipy import sparse
+
+        return sparse.csr_matrix((numpy.frombuffer(self.values, dtype=numpy.int32),
+                                  (numpy.frombuffer(self.rows, dtype=numpy.int32),
+                                   numpy.frombuffer(self.columns, dtype=numpy.int32))),
+                                 shape=(len(self.document_ids), len(self.entities)))
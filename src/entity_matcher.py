@@ -0,0 +1,77 @@
+from collections import Counter, deque
+from typing import Iterable, Iterator
+
+
+def normalize(alias: str) -> str:
+    return ' '.join(alias.lower().split())
+
+
+def compile_index(classes: dict[str, dict[str, list[str]]]) -> dict[str, list[tuple[str, str]]]:
+    # map each normalized alias to every (class, member) that lists it
+    index = {}
+    for class_name, class_members in classes.items():
+        for member, pseudonyms in class_members.items():
+            for pseudonym in pseudonyms:
+                index.setdefault(normalize(pseudonym), []).append((class_name, member))
+    return index
+
+
+class AliasAutomaton:
+    def __init__(self, aliases: Iterable[str]):
+        # aho-corasick trie over the normalized aliases
+        self.transitions = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+        for alias in {normalize(alias) for alias in aliases}:
+            state = 0
+            for character in alias:
+                if character not in self.transitions[state]:
+                    self.transitions.append({})
+                    self.fail.append(0)
+                    self.outputs.append([])
+                    self.transitions[state][character] = len(self.transitions) - 1
+                state = self.transitions[state][character]
+            self.outputs[state].append(len(alias))
+
+        # breadth first so every failure link points at an already finished state
+        queue = deque(self.transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for character, next_state in self.transitions[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and character not in self.transitions[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.transitions[fallback].get(character, 0)
+                self.outputs[next_state] = self.outputs[next_state] + self.outputs[self.fail[next_state]]
+
+    def find(self, text: str) -> Iterator[tuple[int, int]]:
+        # leftmost-longest, non-overlapping matches that start and end on word boundaries. a run of whitespace is fed
+        # to the trie as one space, as normalize does, so positions records where each character fed came from
+        lowered = text.lower()
+        matches = []
+        positions = []
+        state = 0
+        for position, character in enumerate(lowered):
+            if character.isspace():
+                if position and lowered[position - 1].isspace():
+                    continue
+                character = ' '
+            positions.append(position)
+            while state and character not in self.transitions[state]:
+                state = self.fail[state]
+            state = self.transitions[state].get(character, 0)
+            for length in self.outputs[state]:
+                start, end = positions[len(positions) - length], position + 1
+                if (start == 0 or not lowered[start - 1].isalnum()) and \
+                        (end == len(lowered) or not lowered[end].isalnum()):
+                    matches.append((start, end))
+
+        last_end = 0
+        for start, end in sorted(matches, key=lambda match: (match[0], match[0] - match[1])):
+            if start >= last_end:
+                last_end = end
+                yield start, end
+
+    def count(self, text: str) -> Counter:
+        return Counter(normalize(text[start:end]) for start, end in self.find(text))
@@ -0,0 +1,65 @@
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+# where each source keeps its article body and publication date, as (tag, class) pairs tried in order
+selectors = {
+    'cnn': {
+        'body': [('div', 'article__content'), ('div', 'Article__content')],
+        'date': []
+    },
+    'fox_news': {
+        'body': [('div', 'article-body')],
+        'date': [('time', None)]
+    },
+    'reuters': {
+        'body': [('div', 'article-body__content__17Yit')],
+        'date': [('date', None)]
+    }
+}
+
+
+def xpath(tag: str, class_name: str | None) -> str:
+    # first element with the tag and, if given, the class among its classes
+    if class_name is None:
+        return f'(//{tag})[1]'
+    return f'(//{tag}[contains(concat(" ", normalize-space(@class), " "), " {class_name} ")])[1]'
+
+
+def extract_lxml(html_doc: str, source: str) -> tuple[str | None, str]:
+    if not html_doc.strip():
+        return None, ''
+    root = lxml_html.document_fromstring(html_doc.encode('utf-8'),
+                                         parser=lxml_html.HTMLParser(encoding='utf-8'))
+    found = {}
+    for field, candidates in selectors[source].items():
+        for tag, class_name in candidates:
+            elements = root.xpath(xpath(tag, class_name))
+            if elements:
+                found[field] = elements[0].text_content()
+                break
+    return found.get('date'), found.get('body', '')
+
+
+def extract_soup(html_doc: str, source: str) -> tuple[str | None, str]:
+    # only build the subtrees that a selector could match rather than the whole page
+    tags = {tag for candidates in selectors[source].values() for tag, _ in candidates}
+    soup = BeautifulSoup(html_doc, 'html.parser', parse_only=SoupStrainer(list(tags)))
+    found = {}
+    for field, candidates in selectors[source].items():
+        for tag, class_name in candidates:
+            element = soup.find(tag, class_=class_name) if class_name else soup.find(tag)
+            if element:
+                found[field] = element.text
+                break
+    return found.get('date'), found.get('body', '')
+
+
+def extract(html_doc: str, source: str, backend: str | None = None) -> tuple[str | None, str]:
+    # publication date and article body in one pass, using lxml when it is installed
+    if (backend or ('lxml' if lxml_html is not None else 'soup')) == 'lxml':
+        return extract_lxml(html_doc, source)
+    return extract_soup(html_doc, source)
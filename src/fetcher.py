@@ -0,0 +1,164 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.instrumentation import metrics
+from src.response_archive import ResponseArchive
+
+
+class Fetcher:
+    def __init__(self, max_workers: int = 16, per_domain_limit: int = 4, timeout: float = 30.0, retries: int = 3,
+                 backoff_factor: float = 0.5, headers: dict[str, str] | None = None,
+                 archive: ResponseArchive | None = None, offline: bool = False):
+        self.max_workers = max_workers
+        self.per_domain_limit = per_domain_limit
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.headers = headers or {'User-Agent': 'Mozilla/5.0 (compatible; china-media-analysis)'}
+        self.archive = archive
+        self.offline = offline
+        self._local = threading.local()
+        self._sessions = []
+        self._executor = None
+        self._lock = threading.Lock()
+        self._domain_limits = {}
+        self._domain_lock = threading.Lock()
+
+    def session(self) -> requests.Session:
+        # sessions are not thread safe, so each worker thread keeps its own pooled session
+        if not hasattr(self._local, 'session'):
+            retry = Retry(total=self.retries, backoff_factor=self.backoff_factor,
+                          status_forcelist=[429, 500, 502, 503, 504], allowed_methods=['GET', 'HEAD'],
+                          raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.per_domain_limit,
+                                  max_retries=retry)
+            session = requests.Session()
+            session.headers.update(self.headers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._local.session = session
+            with self._lock:
+                self._sessions.append(session)
+        return self._local.session
+
+    def executor(self) -> ThreadPoolExecutor:
+        # one pool for the fetcher's lifetime, so its threads, and the connections their sessions hold open, are
+        # reused by every later call instead of being opened again for each batch of urls
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='fetcher')
+            return self._executor
+
+    def close(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+            sessions, self._sessions = self._sessions, []
+            self._local = threading.local()
+        if executor is not None:
+            executor.shutdown()
+        for session in sessions:
+            session.close()
+
+    def domain_limit(self, url: str) -> threading.BoundedSemaphore:
+        domain = urlsplit(url).netloc.lower()
+        with self._domain_lock:
+            if domain not in self._domain_limits:
+                self._domain_limits[domain] = threading.BoundedSemaphore(self.per_domain_limit)
+            return self._domain_limits[domain]
+
+    def get(self, url: str) -> requests.Response:
+        archived = self.archive.load(url) if self.archive is not None else None
+        if self.offline:
+            if archived is None:
+                raise LookupError(f"{url} is not in the response archive")
+            metrics.increment('fetch.archive_hits')
+            return archived
+
+        # revalidate archived responses so unchanged pages are not downloaded again
+        headers = self.archive.validators(archived) if archived is not None else {}
+        with self.domain_limit(url), metrics.timer('fetch.request'):
+            response = self.session().get(url, headers=headers, timeout=self.timeout)
+        metrics.increment('fetch.requests')
+        metrics.increment('fetch.bytes', len(response.content))
+        if response.status_code == 304 and archived is not None:
+            metrics.increment('fetch.archive_hits')
+            return archived
+        if self.archive is not None and response.ok:
+            self.archive.store(url, response)
+        return response
+
+    def download(self, url: str, path: str) -> requests.Response:
+        # write the body to path in chunks rather than holding it in memory; with an archive the body is archived from
+        # that file, and the returned response only carries the status and headers
+        archived = self.archive.load(url, content=False) if self.archive is not None else None
+        if self.offline:
+            if archived is None:
+                raise LookupError(f"{url} is not in the response archive")
+            self.archive.copy_body(url, path)
+            metrics.increment('fetch.archive_hits')
+            return archived
+
+        headers = self.archive.validators(archived) if archived is not None else {}
+        with self.domain_limit(url), metrics.timer('fetch.request'):
+            with self.session().get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                if response.status_code == 304 and archived is not None:
+                    self.archive.copy_body(url, path)
+                    metrics.increment('fetch.archive_hits')
+                    return archived
+                with open(path, 'wb') as file:
+                    for chunk in response.iter_content(chunk_size=1 << 16):
+                        file.write(chunk)
+                        metrics.increment('fetch.bytes', len(chunk))
+        metrics.increment('fetch.requests')
+        if self.archive is not None and response.ok:
+            self.archive.store_file(url, path, response)
+        return response
+
+    def download_all(self, urls: list[str], paths: list[str]) -> Iterator[requests.Response]:
+        yield from self.executor().map(self.download, urls, paths)
+
+    def get_all(self, urls: list[str]) -> list[requests.Response]:
+        # responses come back in the same order as the urls
+        return list(self.executor().map(self.get, urls))
+
+    def iter_all(self, urls: list[str]) -> Iterator[requests.Response]:
+        # like get_all, but each response is handed over as soon as it and everything before it has arrived
+        yield from self.executor().map(self.get, urls)
+
+
+# shared by every loader so connections are reused across sources
+default_fetcher = Fetcher()
+
+
+def configure(**kwargs) -> Fetcher:
+    # replace the shared fetcher, e.g. configure(archive=ResponseArchive(), offline=True)
+    global default_fetcher
+    default_fetcher.close()
+    default_fetcher = Fetcher(**kwargs)
+    return default_fetcher
+
+
+def fetch(url: str) -> requests.Response:
+    return default_fetcher.get(url)
+
+
+def fetch_all(urls: list[str]) -> list[requests.Response]:
+    return default_fetcher.get_all(urls)
+
+
+def fetch_iter(urls: list[str]) -> Iterator[requests.Response]:
+    return default_fetcher.iter_all(urls)
+
+
+def fetch_file(url: str, path: str) -> requests.Response:
+    return default_fetcher.download(url, path)
+
+
+def fetch_files(urls: list[str], paths: list[str]) -> Iterator[requests.Response]:
+    return default_fetcher.download_all(urls, paths)
@@ -0,0 +1,156 @@
+import cProfile
+import functools
+import json
+import os
+import profile
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterable, Iterator, TextIO
+
+
+class Metrics:
+    def __init__(self):
+        self.counters = {}
+        self.timers = {}
+        self.log = None
+        self._lock = threading.Lock()
+
+    def open_log(self, path: str) -> None:
+        # every observation is also appended to a jsonl file
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.log = open(path, 'a', encoding='utf-8')
+
+    def _write(self, record: dict) -> None:
+        # caller holds the lock
+        if self.log is not None:
+            self.log.write(json.dumps({'time': time.time(), **record}) + '\n')
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            self._write({'metric': name, 'type': 'counter', 'value': value})
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            count, total, longest = self.timers.get(name, (0, 0.0, 0.0))
+            self.timers[name] = (count + 1, total + seconds, max(longest, seconds))
+            self._write({'metric': name, 'type': 'timer', 'value': seconds})
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def timed(self, name: str) -> Callable:
+        # decorator recording how long each call takes
+        def decorator(function: Callable) -> Callable:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {'counters': dict(self.counters),
+                    'timers': {name: {'count': count, 'seconds': total, 'max_seconds': longest}
+                               for name, (count, total, longest) in self.timers.items()}}
+
+    def prometheus(self) -> str:
+        # prometheus text exposition format
+        lines = []
+        snapshot = self.snapshot()
+        for name, value in snapshot['counters'].items():
+            metric = prometheus_name(name)
+            lines += [f'# TYPE {metric}_total counter', f'{metric}_total {value}']
+        for name, timer in snapshot['timers'].items():
+            metric = prometheus_name(name) + '_seconds'
+            lines += [f'# TYPE {metric} summary', f'{metric}_count {timer["count"]}',
+                      f'{metric}_sum {timer["seconds"]}']
+        return '\n'.join(lines) + '\n'
+
+    def close(self) -> None:
+        snapshot = self.snapshot()
+        with self._lock:
+            if self.log is not None:
+                self._write({'metric': 'snapshot', 'type': 'snapshot', 'value': snapshot})
+                self.log.close()
+                self.log = None
+
+
+def prometheus_name(name: str) -> str:
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+# shared by every module so a run reports into one place
+metrics = Metrics()
+
+
+def serve_prometheus(port: int, registry: Metrics = metrics) -> ThreadingHTTPServer:
+    # expose the metrics for scraping at http://localhost:<port>/metrics
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = registry.prometheus().encode('utf-8')
+            self.send_response(200 if self.path == '/metrics' else 404)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def profile_stage(name: str, items: Iterable, directory: str = 'profiles') -> Iterator:
+    # run a pipeline stage under a profiler, dumping its stats to <directory>/<name>.prof once it finishes.
+    # from python 3.12 cProfile hooks the whole process and only one can be active, but every stage runs on its own
+    # thread, so there the pure python profiler is used instead: it hooks only the calling thread (at some overhead)
+    if sys.version_info >= (3, 12):
+        profiler = profile.Profile()
+
+        def advance(iterator):
+            return profiler.runcall(next, iterator)
+    else:
+        profiler = cProfile.Profile()
+
+        def advance(iterator):
+            profiler.enable()
+            try:
+                return next(iterator)
+            finally:
+                profiler.disable()
+
+    iterator = iter(items)
+    try:
+        while True:
+            try:
+                item = advance(iterator)
+            except StopIteration:
+                break
+            yield item
+    finally:
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(directory, f'{name}.prof'))
+
+
+def write_summary(file: TextIO, registry: Metrics = metrics) -> None:
+    # human readable totals, slowest stages first
+    timers = sorted(registry.snapshot()['timers'].items(), key=lambda timer: -timer[1]['seconds'])
+    for name, timer in timers:
+        file.write(f"{name:<32} {timer['count']:>8} calls {timer['seconds']:>10.2f}s "
+                   f"{timer['seconds'] / timer['count'] * 1000:>10.2f}ms avg\n")
+    for name, value in registry.snapshot()['counters'].items():
+        file.write(f"{name:<32} {value:>8}\n")
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from typing import Callable, Iterable, Iterator
+
+from src.instrumentation import metrics
+
+Spans = list[tuple[str, str, int, int]]
+
+
+class NERService:
+    def __init__(self, extract: Callable[[list[str]], list[Spans]], batch_size: int = 32, max_latency: float = 0.05,
+                 max_queue: int = 256):
+        # extract maps a batch of texts to their spans; it runs on one worker thread so the model is never shared
+        self.extract = extract
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.max_queue = max_queue
+
+    async def serve(self, path: str) -> None:
+        if os.path.exists(path):
+            os.remove(path)
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        server = await asyncio.start_unix_server(self.handle, path=path)
+        batcher = asyncio.create_task(self.batch())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # one json request per line, answered in the order it arrived
+        responses = asyncio.Queue()
+
+        async def respond():
+            while (item := await responses.get()) is not None:
+                request_id, future = item
+                try:
+                    response = {'id': request_id, 'spans': await future}
+                except Exception as e:
+                    response = {'id': request_id, 'error': repr(e)}
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+
+        responder = asyncio.create_task(respond())
+        try:
+            while line := await reader.readline():
+                request = json.loads(line)
+                future = asyncio.get_running_loop().create_future()
+                await responses.put((request.get('id'), future))
+                # blocks once max_queue documents are waiting, so this connection is not read any further and the
+                # client's sends back up until inference catches up
+                await self.queue.put((request['text'], future))
+                metrics.increment('ner_service.requests')
+        finally:
+            await responses.put(None)
+            await responder
+            writer.close()
+
+    async def batch(self) -> None:
+        # a batch is sent to the model once it is full or its oldest document has waited max_latency
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_latency
+            while len(batch) < self.batch_size and (remaining := deadline - loop.time()) > 0:
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            metrics.increment('ner_service.batches')
+            metrics.increment('ner_service.batched_documents', len(batch))
+            try:
+                spans = await loop.run_in_executor(None, self.extract, [text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), document_spans in zip(batch, spans):
+                future.set_result(document_spans)
+
+
+def serve(extract: Callable[[list[str]], list[Spans]], path: str = 'data/ner.sock', **kwargs) -> None:
+    asyncio.run(NERService(extract, **kwargs).serve(path))
+
+
+class NERClient:
+    def __init__(self, path: str = 'data/ner.sock', max_in_flight: int = 128, connect_timeout: float = 30.0):
+        # waits up to connect_timeout for the service, which may still be loading its model
+        self.path = path
+        self.max_in_flight = max_in_flight
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            try:
+                self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.socket.connect(path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                self.socket.close()
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.5)
+        self.reader = self.socket.makefile('rb')
+        self.writer = self.socket.makefile('wb')
+
+    def annotate(self, texts: Iterable[str]) -> Iterator[Spans]:
+        # texts are sent from a background thread while spans are read back, with at most max_in_flight outstanding
+        slots = threading.BoundedSemaphore(self.max_in_flight)
+        sent = queue.Queue()
+        failure = []
+
+        def send():
+            try:
+                for request_id, text in enumerate(texts):
+                    slots.acquire()
+                    self.writer.write(json.dumps({'id': request_id, 'text': text}).encode('utf-8') + b'\n')
+                    self.writer.flush()
+                    sent.put(request_id)
+            except BaseException as e:
+                failure.append(e)
+            finally:
+                sent.put(None)
+
+        sender = threading.Thread(target=send, daemon=True)
+        sender.start()
+        while sent.get() is not None:
+            response = json.loads(self.reader.readline())
+            slots.release()
+            if 'error' in response:
+                raise RuntimeError(f"NER service failed on a document: {response['error']}")
+            yield [tuple(span) for span in response['spans']]
+        sender.join()
+        if failure:
+            raise failure[0]
+
+    def close(self) -> None:
+        self.reader.close()
+        self.writer.close()
+        self.socket.close()
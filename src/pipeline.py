@@ -0,0 +1,39 @@
+import queue
+import threading
+from typing import Callable, Iterable, Iterator
+
+# marks the end of a stage's output
+_end = object()
+
+
+class _Failure:
+    def __init__(self, exception: BaseException):
+        self.exception = exception
+
+
+def stage(items: Iterable, maxsize: int = 64) -> Iterator:
+    # consume items on a background thread, holding at most maxsize of them in memory at once
+    buffer = queue.Queue(maxsize=maxsize)
+
+    def produce():
+        try:
+            for item in items:
+                buffer.put(item)
+        except BaseException as e:
+            buffer.put(_Failure(e))
+        finally:
+            buffer.put(_end)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while (item := buffer.get()) is not _end:
+        if isinstance(item, _Failure):
+            raise item.exception
+        yield item
+
+
+def run(items: Iterable, stages: list[Callable[[Iterable], Iterable]], maxsize: int = 64) -> Iterator:
+    # chain generator stages with a bounded queue between each, so every stage works concurrently
+    for function in stages:
+        items = stage(function(items), maxsize=maxsize)
+    return iter(items)
+
@@ -0,0 +1,80 @@
+import bisect
+import re
+from typing import Iterable, Iterator
+
+from src.entity_matcher import AliasAutomaton, normalize
+from src.instrumentation import metrics
+
+# a sentence ends at ., ! or ? (optionally closed by a quote or bracket) followed by whitespace and something that can
+# start a sentence, or at a line break; abbreviations such as "U.S. officials" stay in one sentence
+_boundary = re.compile(r'(?:(?<=[.!?])|(?<=[.!?]["\')\]]))\s+(?=["\'(\[]?[A-Z0-9])|\s*\n\s*')
+
+
+def sentence_spans(text: str) -> Iterator[tuple[int, int]]:
+    start = 0
+    for boundary in _boundary.finditer(text):
+        if boundary.start() > start:
+            yield start, boundary.start()
+        start = boundary.end()
+    if start < len(text):
+        yield start, len(text)
+
+
+class RelevanceGate:
+    def __init__(self, aliases: Iterable[str], context: int = 1):
+        # keep sentences with an alias in them, plus context sentences either side to give NER its surroundings
+        self.automaton = AliasAutomaton(aliases)
+        self.context = context
+
+    def select(self, text: str) -> tuple[str, list[tuple[int, int]]]:
+        # the relevant text, and (gated start, original start) for each run of consecutive kept sentences
+        sentences = list(sentence_spans(text))
+        starts = [start for start, _ in sentences]
+        keep = [False] * len(sentences)
+        for hit, _ in self.automaton.find(text):
+            sentence = bisect.bisect_right(starts, hit) - 1
+            for index in range(max(sentence - self.context, 0), min(sentence + self.context + 1, len(sentences))):
+                keep[index] = True
+
+        parts, offsets, length = [], [], 0
+        index = 0
+        while index < len(sentences):
+            if not keep[index]:
+                index += 1
+                continue
+            # consecutive kept sentences are copied as one slice so nothing is inserted between them
+            first = index
+            while index + 1 < len(sentences) and keep[index + 1]:
+                index += 1
+            start, end = sentences[first][0], sentences[index][1]
+            if parts:
+                parts.append(' ')
+                length += 1
+            offsets.append((length, start))
+            parts.append(text[start:end])
+            length += end - start
+            index += 1
+
+        metrics.increment('relevance.characters', len(text))
+        metrics.increment('relevance.kept_characters', length)
+        return ''.join(parts), offsets
+
+    @staticmethod
+    def restore(spans: list[tuple[str, str, int, int]],
+                offsets: list[tuple[int, int]]) -> list[tuple[str, str, int, int]]:
+        # map spans found in the gated text back to character offsets in the original document
+        gated_starts = [gated for gated, _ in offsets]
+        restored = []
+        for text, label, start, end in spans:
+            gated, original = offsets[bisect.bisect_right(gated_starts, start) - 1]
+            restored.append((text, label, start - gated + original, end - gated + original))
+        return restored
+
+
+def span_recall(full: list[tuple[str, str, int, int]], gated: list[tuple[str, str, int, int]],
+                aliases: set[str]) -> dict[str, int]:
+    # how many of full NER's spans the gated run found too, overall and for spans that are class aliases
+    found = set(gated)
+    relevant = [span for span in full if normalize(span[0]) in aliases]
+    return {'spans': len(full), 'recalled_spans': sum(span in found for span in full),
+            'alias_spans': len(relevant), 'recalled_alias_spans': sum(span in found for span in relevant)}
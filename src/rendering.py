@@ -0,0 +1,87 @@
+import hashlib
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable
+
+import pandas
+
+from src.aggregation import (class_proportion_table, entity_proportion_table, mentions_per_document_table,
+                             raw_count_table)
+
+# bump when the drawing code changes so cached renders are not reused
+render_version = 1
+
+# panel -> (title, y label); bar panels are drawn with seaborn, proportion panels as stacked pandas bars
+panels = {
+    'raw_counts': ("Raw Entity Mentions by Organization", "Raw Count"),
+    'mentions_per_document': ("Mentions per Document by Organization", "Mentions per Document"),
+    'entity_proportions': ("Proportion of Entity Mentions by Organization", "Percent"),
+    'class_proportions': ("Proportion of Entity Mentions Classes by Organization", "Percent")
+}
+
+
+def panel_tables(data: pandas.DataFrame, classes: dict[str, dict[str, list[str]]]) -> dict[str, pandas.DataFrame]:
+    return {
+        'raw_counts': raw_count_table(data),
+        'mentions_per_document': mentions_per_document_table(data),
+        'entity_proportions': entity_proportion_table(data),
+        'class_proportions': class_proportion_table(data, classes)
+    }
+
+
+def render_key(name: str, table: pandas.DataFrame, file_format: str, dpi: int, figsize: tuple[float, float]) -> str:
+    # everything that affects the rendered file, so equal keys mean equal images
+    digest = hashlib.sha256()
+    for part in [name, table.to_csv(), file_format, str(dpi), str(figsize), str(render_version)]:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def render_panel(name: str, table: pandas.DataFrame, path: str, dpi: int = 144,
+                 figsize: tuple[float, float] = (9, 9)) -> str:
+    # runs in a worker process; Agg needs no display, so this works on headless servers
+    import matplotlib
+    matplotlib.use('Agg')
+    import seaborn
+    from matplotlib import pyplot
+
+    title, ylabel = panels[name]
+    fig, ax = pyplot.subplots(dpi=dpi, figsize=figsize)
+    if name in ['raw_counts', 'mentions_per_document']:
+        seaborn.barplot(table, x="Class", y=ylabel, hue="Organization", ax=ax)
+    else:
+        table.plot(kind='bar', stacked=True, ax=ax)
+    ax.set_title(title)
+    ax.set_ylabel(ylabel)
+    fig.tight_layout()
+    fig.savefig(f'{path}.tmp', format=os.path.splitext(path)[1][1:])
+    pyplot.close(fig)
+    os.replace(f'{path}.tmp', path)
+    return path
+
+
+def render_panels(data: pandas.DataFrame, classes: dict[str, dict[str, list[str]]], directory: str = 'figures',
+                  formats: Iterable[str] = ('png',), names: list[str] | None = None, dpi: int = 144,
+                  figsize: tuple[float, float] = (9, 9), workers: int = 4) -> list[str]:
+    # one file per panel and format, rendered in parallel and reused from the cache when the data has not changed
+    cache_directory = os.path.join(directory, '.cache')
+    os.makedirs(cache_directory, exist_ok=True)
+    tables = panel_tables(data, classes)
+    jobs, outputs = [], []
+    for name in names or list(panels):
+        for file_format in formats:
+            cached = os.path.join(cache_directory, f'{name}-{render_key(name, tables[name], file_format, dpi, figsize)}'
+                                                   f'.{file_format}')
+            outputs.append((cached, os.path.join(directory, f'{name}.{file_format}')))
+            if not os.path.exists(cached):
+                jobs.append((name, tables[name], cached))
+
+    if jobs:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            list(executor.map(render_panel, *zip(*jobs), [dpi] * len(jobs), [figsize] * len(jobs)))
+
+    for cached, output in outputs:
+        shutil.copyfile(cached, output)
+    return [output for _, output in outputs]
@@ -0,0 +1,120 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+class ResponseArchive:
+    def __init__(self, directory: str = 'data/responses'):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(os.path.join(directory, 'index.sqlite'), check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS responses "
+                                "(url TEXT PRIMARY KEY, blob TEXT NOT NULL, status INTEGER NOT NULL, "
+                                "headers TEXT NOT NULL, fetched_at REAL NOT NULL)")
+        self.connection.commit()
+
+    def blob_path(self, blob: str) -> str:
+        # shard blobs into subdirectories so no single directory grows too large
+        return os.path.join(self.directory, blob[:2], f'{blob}.gz')
+
+    def _row(self, url: str) -> tuple[str, int, str] | None:
+        with self._lock:
+            return self.connection.execute("SELECT blob, status, headers FROM responses WHERE url = ?",
+                                           (url,)).fetchone()
+
+    def load(self, url: str, content: bool = True) -> requests.Response | None:
+        # with content=False only the status and headers are rebuilt, e.g. before copying a large body with copy_body
+        row = self._row(url)
+        if row is None:
+            return None
+        blob, status, headers = row
+
+        # rebuild a response so loaders cannot tell an archived page from a fetched one
+        response = requests.Response()
+        if content:
+            with gzip.open(self.blob_path(blob), 'rb') as blob_file:
+                response._content = blob_file.read()
+        else:
+            response._content = None
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(json.loads(headers))
+        response.url = url
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        return response
+
+    def copy_body(self, url: str, path: str) -> None:
+        # decompress an archived body straight into path, a chunk at a time
+        blob, _, _ = self._row(url)
+        with gzip.open(self.blob_path(blob), 'rb') as blob_file, open(path, 'wb') as file:
+            shutil.copyfileobj(blob_file, file, 1 << 16)
+
+    def store(self, url: str, response: requests.Response) -> None:
+        # content addressed, so identical bodies are only written once
+        blob = hashlib.sha256(response.content).hexdigest()
+        path = self.blob_path(blob)
+        if not os.path.exists(path):
+            self._write_blob(path, [response.content])
+        self._index(url, blob, response)
+
+    def store_file(self, url: str, body_path: str, response: requests.Response) -> None:
+        # like store, for a body that was streamed to body_path instead of being held in memory
+        digest = hashlib.sha256()
+        with open(body_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 16), b''):
+                digest.update(chunk)
+        blob = digest.hexdigest()
+        path = self.blob_path(blob)
+        if not os.path.exists(path):
+            with open(body_path, 'rb') as file:
+                self._write_blob(path, iter(lambda: file.read(1 << 16), b''))
+        self._index(url, blob, response)
+
+    def _index(self, url: str, blob: str, response: requests.Response) -> None:
+        headers = {key: value for key, value in response.headers.items()
+                   if key.lower() in ['content-type', 'etag', 'last-modified']}
+        with self._lock:
+            self.connection.execute("INSERT OR REPLACE INTO responses (url, blob, status, headers, fetched_at) "
+                                    "VALUES (?, ?, ?, ?, ?)",
+                                    (url, blob, response.status_code, json.dumps(headers), time.time()))
+            self.connection.commit()
+
+    def _write_blob(self, path: str, chunks) -> None:
+        # each writer gets its own temporary file, so threads storing the same body concurrently cannot collide;
+        # whichever finishes second finds the blob already there and just drops its copy
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as raw_file, gzip.open(raw_file, 'wb') as blob_file:
+                for chunk in chunks:
+                    blob_file.write(chunk)
+            if os.path.exists(path):
+                os.remove(temporary_path)
+            else:
+                os.replace(temporary_path, path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+
+    def validators(self, response: requests.Response) -> dict[str, str]:
+        # headers for a conditional request against an archived response
+        headers = {}
+        if 'ETag' in response.headers:
+            headers['If-None-Match'] = response.headers['ETag']
+        if 'Last-Modified' in response.headers:
+            headers['If-Modified-Since'] = response.headers['Last-Modified']
+        return headers
+
+    def close(self) -> None:
+        with self._lock:
+            self.connection.close()
@@ -0,0 +1,87 @@
+import os
+import sqlite3
+from collections import Counter
+from datetime import date, timedelta
+
+from src.dates import published_day
+from src.entity_matcher import compile_index, normalize
+from src.instrumentation import metrics
+
+periods = ['day', 'week']
+
+
+def bucket_start(day: date, period: str) -> str:
+    # weeks start on monday
+    if period == 'week':
+        day -= timedelta(days=day.weekday())
+    return day.isoformat()
+
+
+class MentionRollups:
+    def __init__(self, path: str = 'data/rollups.sqlite', classes: dict[str, dict[str, list[str]]] | None = None,
+                 rebuild: bool = False):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.index = compile_index(classes or {})
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        if rebuild:
+            for table in ['mentions', 'documents', 'seen']:
+                self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS mentions (period TEXT NOT NULL, bucket TEXT NOT NULL, "
+                                "organization TEXT NOT NULL, class TEXT NOT NULL, member TEXT NOT NULL, "
+                                "count INTEGER NOT NULL, PRIMARY KEY (period, bucket, organization, class, member))")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS documents (period TEXT NOT NULL, bucket TEXT NOT NULL, "
+                                "organization TEXT NOT NULL, count INTEGER NOT NULL, "
+                                "PRIMARY KEY (period, bucket, organization))")
+        # documents already rolled up, so re-importing an article never counts it twice
+        self.connection.execute("CREATE TABLE IF NOT EXISTS seen (organization TEXT NOT NULL, url TEXT NOT NULL, "
+                                "PRIMARY KEY (organization, url))")
+        self.connection.commit()
+
+    def add(self, organization: str, url: str, published: str | None, entities: list[str]) -> bool:
+        # fold one document into every bucket it falls in; only the touched rows are updated
+        day = published_day(published)
+        if day is None:
+            metrics.increment('rollups.undated')
+            return False
+        if self.connection.execute("INSERT OR IGNORE INTO seen (organization, url) VALUES (?, ?)",
+                                   (organization, url)).rowcount == 0:
+            return False
+
+        members = Counter(member for entity in entities for member in self.index.get(normalize(entity), []))
+        for period in periods:
+            bucket = bucket_start(day, period)
+            self.connection.execute("INSERT INTO documents (period, bucket, organization, count) VALUES (?, ?, ?, 1) "
+                                    "ON CONFLICT DO UPDATE SET count = count + 1", (period, bucket, organization))
+            self.connection.executemany(
+                "INSERT INTO mentions (period, bucket, organization, class, member, count) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT DO UPDATE SET count = count + excluded.count",
+                [(period, bucket, organization, class_name, member, count)
+                 for (class_name, member), count in members.items()])
+        metrics.increment('rollups.documents')
+        return True
+
+    def trend(self, period: str = 'week', by: str = 'class', organizations: list[str] | None = None,
+              start: str | None = None, end: str | None = None) -> list[tuple[str, str, str, int, int]]:
+        # (bucket, organization, class or member, mentions, documents) rows, oldest bucket first
+        if period not in periods or by not in ['class', 'member']:
+            raise ValueError(f"unknown period {period!r} or grouping {by!r}")
+        conditions, parameters = ["m.period = ?"], [period]
+        if organizations is not None:
+            conditions.append(f"m.organization IN ({', '.join('?' * len(organizations))})")
+            parameters += organizations
+        if start is not None:
+            conditions.append("m.bucket >= ?")
+            parameters.append(bucket_start(date.fromisoformat(start), period))
+        if end is not None:
+            conditions.append("m.bucket <= ?")
+            parameters.append(end)
+        return self.connection.execute(
+            f"SELECT m.bucket, m.organization, m.{by}, SUM(m.count), d.count FROM mentions m "
+            f"JOIN documents d ON d.period = m.period AND d.bucket = m.bucket AND d.organization = m.organization "
+            f"WHERE {' AND '.join(conditions)} GROUP BY m.bucket, m.organization, m.{by} "
+            f"ORDER BY m.bucket, m.organization, m.{by}", parameters).fetchall()
+
+    def close(self) -> None:
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,96 @@
+import json
+import os
+from datetime import datetime
+from functools import partial
+from email.utils import parsedate_to_datetime
+from typing import IO, Callable, Iterator
+from xml.etree import ElementTree
+
+# guids remembered per feed, enough to cover any items that share the newest publication date
+watermark_guids = 1000
+
+
+def iter_items(source: str | IO) -> Iterator[ElementTree.Element]:
+    # stream <item> elements without building the whole tree, freeing each one once the caller is done with it
+    for _, element in ElementTree.iterparse(source, events=('end',)):
+        if element.tag == 'item':
+            yield element
+            element.clear()
+
+
+def item_guid(item: ElementTree.Element) -> str | None:
+    return item.findtext('guid') or item.findtext('link')
+
+
+def item_published(item: ElementTree.Element) -> datetime | None:
+    try:
+        return parsedate_to_datetime(item.findtext('pubDate'))
+    except (TypeError, ValueError):
+        return None
+
+
+def load_watermarks(path: str) -> dict[str, dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_watermarks(path: str, watermarks: dict[str, dict]) -> None:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.tmp', 'w') as file:
+        json.dump(watermarks, file, indent=2)
+    os.replace(f'{path}.tmp', path)
+
+
+def save_watermark(path: str, feed: str, watermark: dict) -> None:
+    # re-read the file, so feeds that share it do not overwrite each other's watermarks
+    watermarks = load_watermarks(path)
+    watermarks[feed] = watermark
+    save_watermarks(path, watermarks)
+
+
+def new_items(items: Iterator[ElementTree.Element], watermark: dict,
+              newest_first: bool = True) -> Iterator[ElementTree.Element]:
+    # only pass on items that are newer than the watermark, updating it in place as they go by
+    latest = datetime.fromisoformat(watermark['pubDate']) if watermark.get('pubDate') else None
+    seen = set(watermark.get('guids', []))
+    guids = []
+    newest = latest
+    for item in items:
+        guid, published = item_guid(item), item_published(item)
+        if published is not None and latest is not None and published < latest:
+            # feeds list their newest items first, so everything after this has been seen before
+            if newest_first:
+                break
+            continue
+        if guid in seen:
+            continue
+        guids.append(guid)
+        if published is not None and (newest is None or published > newest):
+            newest = published
+        yield item
+
+    watermark['guids'] = (guids + watermark.get('guids', []))[:watermark_guids]
+    if newest is not None:
+        watermark['pubDate'] = newest.isoformat()
+
+
+def feed_items(source: str | IO, watermark_path: str | None = None, feed: str | None = None,
+               commits: list[Callable[[], None]] | None = None) -> Iterator[ElementTree.Element]:
+    # every item in the feed, or with a watermark file only the items that have not been emitted before. the new
+    # watermark is saved once the items run out, or with a commits list, appended to it as a callback for the caller
+    # to run once everything downstream of the items has succeeded, so a failed run emits them again
+    if watermark_path is None:
+        yield from iter_items(source)
+        return
+
+    feed = feed or os.path.basename(source)
+    watermark = load_watermarks(watermark_path).get(feed, {})
+    yield from new_items(iter_items(source), watermark)
+    commit = partial(save_watermark, watermark_path, feed, watermark)
+    if commits is None:
+        commit()
+    else:
+        commits.append(commit)
@@ -0,0 +1,42 @@
+import re
+from typing import Iterable
+
+# compiled once at import; [^>\n]* and [^\n]*? stop at the same characters as the original lazy .*? groups, so the
+# matches are identical but a failed match cannot run past the end of a tag or line
+rule_sets = {
+    'html': re.compile(r'<\/?a[^>\n]*>|<figure>[^\n]*?<\/figure>|<\/?p>|<div[^>\n]*>[^\n]*?<\/div>|<\/?h\d[^>\n]*>|'
+                       r'<\/?strong>'),
+    'committee': re.compile(r'<\/?a[^>\n]*>|<figure>[^\n]*?<\/figure>|<\/?p>|<div[^>\n]*>[^\n]*?<\/div>|'
+                            r'<\/?h\d[^>\n]*>'),
+    'reuters': re.compile(r'^.*\(Reuters\)\s-\s')
+}
+
+whitespace = re.compile(r'\s+')
+
+# elements whose whole subtree is dropped by the dom backend
+dropped_elements = ['figure', 'div', 'script', 'style']
+
+
+def clean_text(text: str, rules: str = 'html') -> str:
+    return whitespace.sub(' ', rule_sets[rules].sub(' ', text).strip())
+
+
+def clean_text_dom(text: str) -> str:
+    # strip markup by parsing it instead of pattern matching, keeping only the text outside dropped elements
+    from lxml import html
+
+    if not text.strip():
+        return ''
+    root = html.fragment_fromstring(text, create_parent='div')
+    for element in list(root.iter(*dropped_elements)):
+        if element is not root:
+            element.drop_tree()
+    return whitespace.sub(' ', root.text_content()).strip()
+
+
+def clean_texts(texts: Iterable[str], rules: str = 'html', backend: str = 'regex') -> list[str]:
+    # clean a whole batch in one call, e.g. clean_texts(descriptions, rules='html', backend='lxml')
+    if backend == 'lxml':
+        return [clean_text_dom(text) for text in texts]
+    substitute, collapse = rule_sets[rules].sub, whitespace.sub
+    return [collapse(' ', substitute(' ', text).strip()) for text in texts]
@@ -0,0 +1,132 @@
+import glob
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import time
+from typing import Iterable, Iterator
+
+
+def worker_name() -> str:
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+class WorkQueue:
+    def __init__(self, path: str = 'data/work_queue.sqlite', lease_seconds: float = 600.0):
+        # units are leased rather than popped, so a unit whose worker dies is handed out again once its lease expires
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.connection = sqlite3.connect(path, timeout=60.0, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS units (id INTEGER PRIMARY KEY, organization TEXT NOT NULL, "
+                                "documents TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending', worker TEXT, "
+                                "lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS units_status ON units (status, lease_expires)")
+        # every document ever queued, by organization and url, with the doc_id it was given
+        self.connection.execute("CREATE TABLE IF NOT EXISTS queued_documents (organization TEXT NOT NULL, "
+                                "url TEXT NOT NULL, doc_id INTEGER NOT NULL, PRIMARY KEY (organization, url))")
+
+    def enqueue(self, organization: str, documents: Iterable[dict], unit_size: int = 64) -> int:
+        # split the documents into units of unit_size and queue them, returning how many units were added. documents
+        # already queued (by url) are skipped, so re-running enqueue after a source gained or lost articles queues only
+        # the new ones. doc_ids are given out by the queue, since a loader's positions shift between runs
+        units, batch, urls = 0, [], set()
+        for document in documents:
+            if document['url'] in urls or self._queued(organization, document['url']):
+                continue
+            batch.append(document)
+            urls.add(document['url'])
+            if len(batch) >= unit_size:
+                self._insert(organization, batch)
+                units, batch, urls = units + 1, [], set()
+        if batch:
+            self._insert(organization, batch)
+            units += 1
+        return units
+
+    def _queued(self, organization: str, url: str) -> bool:
+        return self.connection.execute("SELECT 1 FROM queued_documents WHERE organization = ? AND url = ?",
+                                       (organization, url)).fetchone() is not None
+
+    def _insert(self, organization: str, documents: list[dict]) -> None:
+        # the unit and its documents are recorded together, so a crash never leaves documents marked as queued
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            (first_doc_id,) = self.connection.execute("SELECT COUNT(*) FROM queued_documents WHERE organization = ?",
+                                                      (organization,)).fetchone()
+            documents = [{**document, 'doc_id': first_doc_id + index} for index, document in enumerate(documents)]
+            self.connection.executemany("INSERT INTO queued_documents (organization, url, doc_id) VALUES (?, ?, ?)",
+                                        [(organization, document['url'], document['doc_id'])
+                                         for document in documents])
+            self.connection.execute("INSERT INTO units (organization, documents) VALUES (?, ?)",
+                                    (organization, json.dumps(documents)))
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+
+    def lease(self, worker: str) -> tuple[int, str, list[dict]] | None:
+        # claim the oldest pending or expired unit; BEGIN IMMEDIATE keeps two workers from claiming the same one
+        now = time.time()
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.connection.execute(
+                "SELECT id, organization, documents FROM units WHERE status = 'pending' "
+                "OR (status = 'leased' AND lease_expires < ?) ORDER BY id LIMIT 1", (now,)).fetchone()
+            if row is not None:
+                self.connection.execute("UPDATE units SET status = 'leased', worker = ?, lease_expires = ?, "
+                                        "attempts = attempts + 1 WHERE id = ?", (worker, now + self.lease_seconds,
+                                                                                 row[0]))
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        unit_id, organization, documents = row
+        return unit_id, organization, json.loads(documents)
+
+    def complete(self, unit_id: int) -> None:
+        self.connection.execute("UPDATE units SET status = 'done', lease_expires = NULL WHERE id = ?", (unit_id,))
+
+    def stats(self) -> dict[str, int]:
+        return dict(self.connection.execute("SELECT status, COUNT(*) FROM units GROUP BY status").fetchall())
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def write_shard(directory: str, unit_id: int, mentions: list[tuple[str, int, str, int]],
+                documents: list[tuple[str, int, str | None]]) -> None:
+    # written under a temporary name and renamed, so a crash never leaves a half written shard behind; the name is
+    # unique to this writer, since a unit whose lease expired can be processed by two workers at once
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'unit-{unit_id:08d}.json')
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump({'mentions': mentions, 'documents': documents}, file)
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+
+def read_shards(directory: str) -> Iterator[tuple[list[tuple[str, int, str, int]], list[tuple[str, int, str | None]]]]:
+    # one shard per completed unit; a unit that was retried overwrote its own shard, so none is counted twice
+    for path in sorted(glob.glob(os.path.join(directory, 'unit-*.json'))):
+        with open(path) as file:
+            shard = json.load(file)
+        yield [tuple(mention) for mention in shard['mentions']], [tuple(document) for document in shard['documents']]
+
+
+def merge_shards(shards: Iterable[tuple[list, list]]) -> tuple[list, list]:
+    # shards hold disjoint documents, so merging is concatenation and can happen in any order or grouping
+    mentions, documents = [], []
+    for shard_mentions, shard_documents in shards:
+        mentions += shard_mentions
+        documents += shard_documents
+    return mentions, documents
@@ -0,0 +1,89 @@
+import functools
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('bs4')
+pytest.importorskip('requests')
+
+from src import fetcher
+from src.cnn_news_data import parse_article
+from src.crawler import BloomFilter, SeenSet, crawl, normalize_url, path_prefixes
+
+
+def article(body: str, links: list[str] = ()) -> str:
+    anchors = ''.join(f'<a href="{link}">link</a>' for link in links)
+    return f'<html><body><div class="article__content">{body}</div>{anchors}</body></html>'
+
+
+# a small cnn-like site: an index page linking to articles, one of them a copy of another under a different url
+site = {
+    'index.html': article('', ['/world/one.html', '/world/one.html?utm_source=home#comments', '/world/copy.html',
+                               '/world/taiwan.html', '/sports/china.html', 'http://example.com/world/away.html']),
+    'world/one.html': article('China and the United States held talks.', ['/world/two.html']),
+    'world/copy.html': article('China and the United States held talks.'),
+    'world/taiwan.html': article('Taiwan held elections.'),
+    'world/two.html': article('Beijing responded to the talks.'),
+    'sports/china.html': article('China won the match.')
+}
+
+
+@pytest.fixture
+def fixture_site(tmp_path, monkeypatch):
+    for path, html_doc in site.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(html_doc, encoding='utf-8')
+
+    class Handler(SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(Handler, directory=str(tmp_path)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(fetcher, 'default_fetcher', fetcher.Fetcher(retries=0))
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+def crawl_site(root: str, **kwargs) -> list[dict]:
+    return list(crawl([f'{root}/index.html'], follow=path_prefixes('/world/'), parse=parse_article,
+                      keep=lambda content: 'china' in content.lower() or 'beijing' in content.lower(),
+                      allowed_domains=['127.0.0.1'], **kwargs))
+
+
+def test_crawl_follows_links_from_the_index(fixture_site):
+    pages = crawl_site(fixture_site)
+    # the tracking copy of one.html is the same url, copy.html the same content, taiwan.html is not kept and
+    # sports and other domains are not followed
+    assert [page['url'] for page in pages] == [f'{fixture_site}/world/one.html']
+    assert pages[0]['content'] == 'China and the United States held talks.'
+    assert pages[0]['date'] is None
+    assert pages[0]['depth'] == 1
+
+
+def test_crawl_max_depth(fixture_site):
+    pages = crawl_site(fixture_site, max_depth=2)
+    assert [(page['url'], page['depth']) for page in pages] == \
+        [(f'{fixture_site}/world/one.html', 1), (f'{fixture_site}/world/two.html', 2)]
+
+
+def test_crawl_max_pages(fixture_site):
+    # the index counts as a page, so only the first article is fetched
+    pages = crawl_site(fixture_site, max_depth=2, max_pages=2)
+    assert [page['url'] for page in pages] == [f'{fixture_site}/world/one.html']
+
+
+def test_normalize_url():
+    assert normalize_url('/World/a.html?b=2&a=1&utm_source=x#top', 'HTTPS://www.CNN.com:443/') == \
+        'https://www.cnn.com/World/a.html?a=1&b=2'
+    assert normalize_url('http://localhost:8000') == 'http://localhost:8000/'
+    assert normalize_url('mailto:news@cnn.com') is None
+
+
+@pytest.mark.parametrize('seen', [SeenSet(), BloomFilter(100)])
+def test_seen_sets(seen):
+    seen.add('https://www.cnn.com/world/one.html')
+    assert 'https://www.cnn.com/world/one.html' in seen
+    assert 'https://www.cnn.com/world/two.html' not in seen
@@ -0,0 +1,49 @@
+from datetime import date
+
+import pytest
+
+from src.dates import published_day
+
+# the formats the sources give, as they arrive
+published = {
+    'Sat, 15 Apr 2023 03:22:00 GMT': date(2023, 4, 15),
+    'Fri, 14 Apr 2023 23:10:00 -0400': date(2023, 4, 14),
+    '2023-04-14T21:05:00Z': date(2023, 4, 14),
+    '2023-04-14': date(2023, 4, 14),
+    ' April 15, 2023 3:22pm EDT': date(2023, 4, 15),
+    'April 9, 2023 11:05AM EST': date(2023, 4, 9),
+    'April 9, 2023': date(2023, 4, 9)
+}
+
+
+@pytest.mark.parametrize('text, day', published.items())
+def test_published_day(text, day):
+    assert published_day(text) == day
+
+
+@pytest.mark.parametrize('text', [None, '', '  ', 'yesterday', 'Updated 3 hours ago'])
+def test_unparseable_dates(text):
+    assert published_day(text) is None
+
+
+def test_document_dates_mixed_formats():
+    # pandas infers one format for a whole column, so mixed sources must not be parsed in one call
+    pytest.importorskip('pandas')
+    from src.count_index import document_dates
+
+    dates = document_dates(list(published) + [None, 'yesterday'])
+    assert dates.dt.date.tolist()[:len(published)] == list(published.values())
+    assert dates.isna().tolist()[len(published):] == [True, True]
+
+
+def test_count_index_from_records_with_undated_documents():
+    # from_records turns the missing dates of a column that also holds strings into NaN floats
+    pytest.importorskip('pandas')
+    from src.count_index import CountIndex
+
+    index = CountIndex.from_records([('AP', 0, 'China', 2), ('Committee', 0, 'China', 1)],
+                                    [('Committee', 0, None), ('AP', 0, 'Sat, 15 Apr 2023 03:22:00 GMT'),
+                                     ('Fox News', 0, ' April 15, 2023 3:22pm EDT')])
+    assert index.documents['date'].isna().tolist() == [True, False, False]
+    assert index.documents_count() == {'AP': 1, 'Committee': 1, 'Fox News': 1}
+    assert index.query(start='2023-04-15').mentions[['organization', 'count']].values.tolist() == [['AP', 2]]
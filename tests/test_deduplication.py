@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+from src.deduplication import Deduplicator, drop_duplicates, shingles
+
+article = ('Chinese and American officials met in Beijing on Tuesday to discuss trade, export controls and the '
+           'situation in the Taiwan Strait, according to statements released by both governments afterwards.')
+
+
+def documents(*texts: str) -> list[dict]:
+    return [{'url': f'https://example.com/{index}', 'text': text} for index, text in enumerate(texts)]
+
+
+def test_near_copies_are_dropped():
+    deduplicator = Deduplicator()
+    kept = list(drop_duplicates(documents(article, article + ' ', article.replace('Tuesday', 'Wednesday')),
+                                deduplicator, 'CNN'))
+    assert [document['url'] for document in kept] == ['https://example.com/0', 'https://example.com/2']
+    assert deduplicator.clusters() == {('CNN', 'https://example.com/0'): [('CNN', 'https://example.com/1')]}
+
+
+def test_short_texts_pass_through_unindexed():
+    # empty pdfs and stubs have no shingles, so they are neither clustered together nor matched later
+    deduplicator = Deduplicator()
+    kept = list(drop_duplicates(documents('', '', 'China responds', 'China responds'), deduplicator, 'Congress'))
+    assert len(kept) == 4
+    assert deduplicator.clusters() == {}
+    assert deduplicator.signatures == {}
+    assert len(shingles('China responds')) == 0
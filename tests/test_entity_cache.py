@@ -0,0 +1,34 @@
+from src.entity_cache import EntityCache
+
+spans = [('China', 'GPE', 0, 5)]
+
+
+def test_hits_do_not_hold_the_write_lock(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    first = EntityCache(path)
+    first.put('hit', spans)
+    first.commit()
+    second = EntityCache(path)
+    second.connection.execute("PRAGMA busy_timeout = 100")
+
+    # a hit in one process leaves another free to write until the first commits
+    assert first.get('hit') == spans
+    second.put('miss', spans)
+    second.commit()
+    assert first.get('miss') == spans
+    first.close()
+    second.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = EntityCache(str(tmp_path / 'cache.sqlite'), max_entries=2)
+    for key in ['a', 'b', 'c']:
+        cache.put(key, spans)
+        cache.commit()
+    assert cache.get('a') == spans
+    cache.close()
+
+    cache = EntityCache(str(tmp_path / 'cache.sqlite'), max_entries=2)
+    assert cache.get('a') == spans and cache.get('b') is None and cache.get('c') == spans
+    assert cache.stats()['entries'] == 2
+    cache.close()
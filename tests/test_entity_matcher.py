@@ -0,0 +1,71 @@
+from collections import Counter
+
+import pytest
+
+from main import classes
+from src.entity_matcher import AliasAutomaton, compile_index
+
+# entity counts as NER produced them, including spellings that differ only in case and strings outside the taxonomy
+source_counts = {
+    'CNN': Counter({'China': 12, 'china': 3, 'Beijing': 4, 'Xi Jinping': 5, 'the Chinese Communist Party': 2,
+                    'CCP': 1, 'PLA': 2, 'Taiwan': 7, 'Biden': 6}),
+    'Reuters': Counter({'China': 20, "People's Liberation Army": 1, 'the Chinese embassy': 2, 'Qin Gang': 3,
+                        'Central Committee': 1, 'Zhongnanhai': 1, 'Washington': 9}),
+    'Fox News': Counter({'Mao Ning': 2, 'the CCP': 4, 'Communist Party': 3, "the People's Republic of China": 1})
+}
+documents_count = {'CNN': 10, 'Reuters': 12, 'Fox News': 5}
+
+
+def nested_loop_counts(source_counts: dict[str, Counter]) -> dict[tuple[str, str], int]:
+    # the original per-token scan over every class and member
+    data = {}
+    for organization, counts in source_counts.items():
+        for token, count in counts.items():
+            for class_name, class_members in classes.items():
+                for member, pseudonyms in class_members.items():
+                    if token.lower() in pseudonyms:
+                        data[(member, organization)] = data.get((member, organization), 0) + count
+    return data
+
+
+def test_compile_index_matches_nested_loops():
+    index = compile_index(classes)
+    data = {}
+    for organization, counts in source_counts.items():
+        for token, count in counts.items():
+            for _, member in index.get(token.lower(), []):
+                data[(member, organization)] = data.get((member, organization), 0) + count
+    assert data == nested_loop_counts(source_counts)
+
+
+def test_figure_data_matches_nested_loops():
+    pytest.importorskip('pandas')
+    from src.aggregation import figure_data, mentions_frame
+
+    mentions = mentions_frame([(organization, 0, entity, count) for organization, counts in source_counts.items()
+                               for entity, count in counts.items()])
+    data = figure_data(mentions, documents_count, classes)
+    assert {(member, organization): count for member, organization, count in
+            zip(data['Class'], data['Organization'], data['Raw Count'])} == nested_loop_counts(source_counts)
+    assert (data['Mentions per Document'] == data['Raw Count'] / data['Organization'].map(documents_count)).all()
+
+
+def test_find_is_leftmost_longest():
+    automaton = AliasAutomaton(['communist party', 'chinese communist party', 'the chinese communist party', 'ccp'])
+    text = "The Chinese Communist Party, the CCP, and a communist party"
+    assert [text[start:end] for start, end in automaton.find(text)] == \
+        ['The Chinese Communist Party', 'CCP', 'communist party']
+
+
+def test_find_respects_word_boundaries():
+    automaton = AliasAutomaton(['pla', 'china'])
+    text = "A plan for PLA drills near Indochina, China's coast and\nchina."
+    assert [text[start:end] for start, end in automaton.find(text)] == ['PLA', 'China', 'china']
+
+
+def test_find_matches_across_whitespace_runs():
+    automaton = AliasAutomaton(['xi jinping'])
+    assert list(automaton.find("President Xi\nJinping")) == [(10, 20)]
+    text = "Xi  Jinping and Xi \n\t Jinping"
+    assert [text[start:end] for start, end in automaton.find(text)] == ['Xi  Jinping', 'Xi \n\t Jinping']
+    assert automaton.count("Xi Jinping met xi jinping") == Counter({'xi jinping': 2})
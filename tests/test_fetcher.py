@@ -0,0 +1,113 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+requests = pytest.importorskip('requests')
+
+from src.fetcher import Fetcher
+
+
+class StubServer(ThreadingHTTPServer):
+    # keeps count of connections, concurrent requests and requests per path
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.active = 0
+        self.max_active = 0
+        self.requests = {}
+
+    def url(self, path: str) -> str:
+        return f'http://127.0.0.1:{self.server_port}{path}'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # keep-alive, so a client that reuses its connections opens only a few
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+            attempt = self.server.requests[self.path] = self.server.requests.get(self.path, 0) + 1
+        try:
+            if self.path.startswith('/slow'):
+                time.sleep(0.2)
+            elif self.path.startswith('/hang'):
+                time.sleep(1)
+            # /flaky fails with a 503 on its first two attempts
+            status = 503 if self.path.startswith('/flaky') and attempt <= 2 else 200
+            body = f'{self.path} {attempt}'.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = StubServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_connections_are_reused_across_calls(server):
+    fetcher = Fetcher(max_workers=4, per_domain_limit=4)
+    urls = [server.url(f'/page/{index}') for index in range(8)]
+    for _ in range(3):
+        assert [response.text for response in fetcher.get_all(urls)] == [f'/page/{index} {_ + 1}'
+                                                                         for index in range(8)]
+    # one connection per pool thread, however many batches are fetched
+    assert server.connections <= 4
+    fetcher.close()
+
+
+def test_per_domain_limit(server):
+    fetcher = Fetcher(max_workers=8, per_domain_limit=2)
+    assert len(list(fetcher.iter_all([server.url(f'/slow/{index}') for index in range(6)]))) == 6
+    assert server.max_active == 2
+    fetcher.close()
+
+
+def test_retries_with_backoff(server):
+    fetcher = Fetcher(retries=3, backoff_factor=0.2)
+    started = time.monotonic()
+    response = fetcher.get(server.url('/flaky'))
+    assert response.status_code == 200 and server.requests['/flaky'] == 3
+    # no wait before the first retry, backoff_factor * 2 before the second
+    assert time.monotonic() - started >= 0.4
+    fetcher.close()
+
+
+def test_retries_give_up(server):
+    fetcher = Fetcher(retries=1, backoff_factor=0)
+    # once retries run out the last response is returned rather than raised
+    assert fetcher.get(server.url('/flaky')).status_code == 503
+    assert server.requests['/flaky'] == 2
+    fetcher.close()
+
+
+def test_timeout(server):
+    fetcher = Fetcher(timeout=0.2, retries=0)
+    started = time.monotonic()
+    with pytest.raises(requests.exceptions.RequestException):
+        fetcher.get(server.url('/hang'))
+    assert time.monotonic() - started < 0.9
+    fetcher.close()
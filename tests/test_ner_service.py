@@ -0,0 +1,63 @@
+import re
+import tempfile
+import threading
+
+import pytest
+
+import main
+from src.instrumentation import metrics
+from src.ner_service import NERClient, serve
+
+_entity = re.compile(r'China|Beijing|Biden')
+
+
+def extract(texts: list[str]) -> list[list[tuple[str, str, int, int]]]:
+    # stands in for the served model
+    return [[(match.group(), 'PERSON' if match.group() == 'Biden' else 'GPE', match.start(), match.end())
+             for match in _entity.finditer(text)] for text in texts]
+
+
+@pytest.fixture(scope='module')
+def service_path():
+    path = f'{tempfile.mkdtemp()}/ner.sock'
+    threading.Thread(target=serve, args=(extract, path), kwargs={'max_latency': 0.01}, daemon=True).start()
+    NERClient(path).close()
+    return path
+
+
+def test_client_annotates_in_order(service_path):
+    client = NERClient(service_path, max_in_flight=2)
+    texts = [f'Beijing {index} China' for index in range(10)]
+    assert list(client.annotate(texts)) == extract(texts)
+    client.close()
+
+
+def test_annotator_uses_the_service_for_recall(service_path, monkeypatch):
+    opened = []
+
+    class Client(NERClient):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.closed = False
+            opened.append(self)
+
+        def close(self):
+            self.closed = True
+            super().close()
+
+    def load_model(model):
+        raise AssertionError('the model is loaded by the service')
+
+    monkeypatch.setattr(main, 'NERClient', Client)
+    monkeypatch.setattr(main, 'load_model', load_model)
+    annotate = main.annotator(ner_service=service_path, relevance_gate=True, relevance_context=0,
+                              relevance_recall=True)
+    documents = [{'doc_id': 0, 'text': 'Officials in Beijing responded. Biden spoke later.'},
+                 {'doc_id': 1, 'text': 'Nothing relevant here.'}]
+    spans = metrics.snapshot()['counters'].get('relevance.spans', 0)
+    annotated = list(annotate(documents))
+
+    # the gated run only sees the sentence with the alias, the recall run the whole text
+    assert [document['entities'] for document in annotated] == [['Beijing'], []]
+    assert metrics.snapshot()['counters']['relevance.spans'] - spans == 2
+    assert len(opened) == 2 and all(client.closed for client in opened)
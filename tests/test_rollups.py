@@ -0,0 +1,20 @@
+from src.rollups import MentionRollups
+
+classes = {'Government': {'Xi Jinping': ['xi jinping', 'xi']}}
+
+
+def test_rollups_mixed_date_formats(tmp_path):
+    rollups = MentionRollups(str(tmp_path / 'rollups.sqlite'), classes)
+    assert rollups.add('Fox News', 'https://www.foxnews.com/world/a', ' April 15, 2023 3:22pm EDT', ['Xi Jinping'])
+    assert rollups.add('AP', 'https://apnews.com/b', 'Mon, 17 Apr 2023 08:00:00 GMT', ['Xi'])
+    assert rollups.add('Reuters', 'https://www.reuters.com/c', '2023-04-17T09:30:00Z', ['xi jinping'])
+    assert not rollups.add('Reuters', 'https://www.reuters.com/d', 'yesterday', ['Xi'])
+    # a document is only ever counted once
+    assert not rollups.add('AP', 'https://apnews.com/b', 'Mon, 17 Apr 2023 08:00:00 GMT', ['Xi'])
+
+    assert rollups.trend(period='day') == [('2023-04-15', 'Fox News', 'Government', 1, 1),
+                                           ('2023-04-17', 'AP', 'Government', 1, 1),
+                                           ('2023-04-17', 'Reuters', 'Government', 1, 1)]
+    assert rollups.trend(period='week', by='member', organizations=['Fox News']) == \
+        [('2023-04-10', 'Fox News', 'Xi Jinping', 1, 1)]
+    rollups.close()
@@ -0,0 +1,42 @@
+import io
+
+from src.rss_feed import feed_items, load_watermarks
+
+feed = b"""<rss><channel>
+<item><guid>c</guid><pubDate>Mon, 17 Apr 2023 08:00:00 GMT</pubDate></item>
+<item><guid>b</guid><pubDate>Sun, 16 Apr 2023 08:00:00 GMT</pubDate></item>
+<item><guid>a</guid><pubDate>Sat, 15 Apr 2023 08:00:00 GMT</pubDate></item>
+</channel></rss>"""
+
+
+def guids(path: str, commits: list | None = None, source: bytes = feed) -> list[str]:
+    return [item.findtext('guid') for item in feed_items(io.BytesIO(source), str(path), 'ap', commits=commits)]
+
+
+def test_watermark_is_saved_by_the_commit(tmp_path):
+    path = tmp_path / 'watermarks.json'
+    commits = []
+    assert guids(path, commits) == ['c', 'b', 'a']
+    # until the caller commits, a failed run would be given the same items again
+    assert not path.exists()
+    assert guids(path) == ['c', 'b', 'a']
+
+    path.unlink()
+    commits = []
+    guids(path, commits)
+    for commit in commits:
+        commit()
+    assert guids(path) == []
+    newer = feed.replace(b'<channel>', b'<channel><item><guid>d</guid>'
+                                       b'<pubDate>Tue, 18 Apr 2023 08:00:00 GMT</pubDate></item>')
+    assert guids(path, source=newer) == ['d']
+
+
+def test_feeds_sharing_a_watermark_file(tmp_path):
+    path = str(tmp_path / 'watermarks.json')
+    commits = []
+    list(feed_items(io.BytesIO(feed), path, 'ap', commits=commits))
+    list(feed_items(io.BytesIO(feed), path, 'cnn', commits=commits))
+    for commit in commits:
+        commit()
+    assert set(load_watermarks(path)) == {'ap', 'cnn'}
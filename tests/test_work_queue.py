@@ -0,0 +1,57 @@
+from src.work_queue import WorkQueue, merge_shards, read_shards, write_shard
+
+
+def documents(count: int) -> list[dict]:
+    return [{'doc_id': doc_id, 'url': f'https://example.com/{doc_id}', 'date': None, 'text': 'China'}
+            for doc_id in range(count)]
+
+
+def test_enqueue_is_idempotent(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.sqlite'))
+    assert queue.enqueue('CNN', documents(10), unit_size=4) == 3
+    assert queue.enqueue('CNN', documents(10), unit_size=4) == 0
+    assert queue.enqueue('Reuters', documents(10), unit_size=4) == 3
+    assert queue.stats() == {'pending': 6}
+    queue.close()
+
+
+def test_enqueue_skips_queued_documents_when_a_source_changes(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.sqlite'))
+    queue.enqueue('CNN', documents(10), unit_size=4)
+    # the next run lost an article and gained one, so every later position shifted
+    changed = [document for document in documents(11) if document['doc_id'] != 2]
+    assert queue.enqueue('CNN', [{**document, 'doc_id': index} for index, document in enumerate(changed)],
+                         unit_size=4) == 1
+
+    queued = []
+    while (unit := queue.lease('a')) is not None:
+        queued += unit[2]
+        queue.complete(unit[0])
+    assert len(queued) == 11
+    assert len({document['url'] for document in queued}) == 11
+    # doc_ids come from the queue, so the new article does not reuse one
+    assert sorted(document['doc_id'] for document in queued) == list(range(11))
+    queue.close()
+
+
+def test_lease_and_complete(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.sqlite'), lease_seconds=-1)
+    queue.enqueue('CNN', documents(3), unit_size=2)
+    unit_id, organization, unit_documents = queue.lease('a')
+    assert organization == 'CNN' and [document['doc_id'] for document in unit_documents] == [0, 1]
+    # the lease has already expired, so another worker is handed the same unit
+    assert queue.lease('b')[0] == unit_id
+    queue.complete(unit_id)
+    assert queue.lease('b')[0] != unit_id
+    assert queue.stats() == {'done': 1, 'leased': 1}
+    queue.close()
+
+
+def test_shards_merge(tmp_path):
+    write_shard(str(tmp_path), 2, [('CNN', 2, 'china', 1)], [('CNN', 2, None)])
+    write_shard(str(tmp_path), 1, [('CNN', 0, 'china', 3)], [('CNN', 0, None), ('CNN', 1, None)])
+    # a retried unit overwrites its shard
+    write_shard(str(tmp_path), 2, [('CNN', 2, 'china', 1)], [('CNN', 2, None)])
+    mentions, documents = merge_shards(read_shards(str(tmp_path)))
+    assert mentions == [('CNN', 0, 'china', 3), ('CNN', 2, 'china', 1)]
+    assert documents == [('CNN', 0, None), ('CNN', 1, None), ('CNN', 2, None)]